@@ -0,0 +1,86 @@
+import threading
+import pytest
+from tools.batching_embedder import BatchingEmbedder
+
+
+class FlakyEmbeddings:
+    """Fails the first failures calls for every text in fail_texts, or always for texts in broken_texts."""
+
+    def __init__(self, failures: int = 0, fail_texts: set[str] = frozenset(), broken_texts: set[str] = frozenset()):
+        self.failures = failures
+        self.fail_texts = fail_texts
+        self.broken_texts = broken_texts
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            if self.broken_texts & set(texts):
+                raise ConnectionError("Ollama is down")
+            if self.fail_texts & set(texts) and self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("connection reset")
+        return [[float(len(text))] for text in texts]
+
+
+def embed(embedder: BatchingEmbedder, texts: list[str]):
+    written = {}
+
+    def write(batch, vectors):
+        written.update(zip(batch.texts, vectors))
+
+    count = embedder.embed_and_write(ids=texts, texts=texts, metadatas=[{} for _ in texts], write=write)
+    return count, written
+
+
+def test_texts_are_embedded_in_batches_of_batch_size():
+    embeddings = FlakyEmbeddings()
+    texts = [f"t{i}" for i in range(7)]
+
+    count, written = embed(BatchingEmbedder(embeddings, batch_size=3, max_in_flight=1), texts)
+
+    assert count == 7
+    assert sorted(len(call) for call in embeddings.calls) == [1, 3, 3]
+    assert written == {text: [float(len(text))] for text in texts}
+
+
+def test_transient_failures_are_retried_with_backoff():
+    embeddings = FlakyEmbeddings(failures=2, fail_texts={"b"})
+
+    count, written = embed(BatchingEmbedder(embeddings, batch_size=1, initial_backoff=0.001), ["a", "b"])
+
+    assert count == 2
+    assert [call for call in embeddings.calls if call == ["b"]] == [["b"]] * 3
+    assert set(written) == {"a", "b"}
+
+
+def test_finished_batches_are_written_before_a_failure_is_raised():
+    embeddings = FlakyEmbeddings(broken_texts={"c"})
+    embedder = BatchingEmbedder(embeddings, batch_size=2, max_retries=1, initial_backoff=0.001)
+    written = {}
+
+    with pytest.raises(ConnectionError):
+        embedder.embed_and_write(
+            ids=["a", "b", "c", "d"],
+            texts=["a", "b", "c", "d"],
+            metadatas=[{}] * 4,
+            write=lambda batch, vectors: written.update(zip(batch.texts, vectors))
+        )
+
+    assert set(written) == {"a", "b"}
+    assert embeddings.calls.count(["c", "d"]) == 2
+
+
+def test_malformed_input_is_not_retried():
+    class Rejecting:
+        calls = 0
+
+        def embed_documents(self, texts):
+            Rejecting.calls += 1
+            raise ValueError("input too long")
+
+    with pytest.raises(ValueError):
+        embed(BatchingEmbedder(Rejecting(), initial_backoff=0.001), ["a"])
+
+    assert Rejecting.calls == 1
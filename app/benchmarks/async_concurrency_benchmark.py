@@ -0,0 +1,61 @@
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stand_ins import StandInChatModel, StandInVectorStore
+from services.rag_service import RagService
+from prompts.prompt_manager import analysis_prompt
+
+# Starlette runs sync endpoints on a threadpool limited to 40 workers
+THREADPOOL_SIZE = 40
+
+
+def build_service(llm, vectorstore, question: str) -> RagService:
+    return RagService() \
+        .with_vectorstore(vectorstore) \
+        .with_llm(model=llm, embeddings=None, temperature=0) \
+        .with_anonymized_planning() \
+        .with_question(question=question)
+
+
+def benchmark_sync(llm, vectorstore, questions: list[str]) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADPOOL_SIZE) as pool:
+        list(pool.map(lambda q: build_service(llm, vectorstore, q).run(prompt=analysis_prompt), questions))
+    return time.perf_counter() - start
+
+
+async def benchmark_async(llm, vectorstore, questions: list[str]) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        build_service(llm, vectorstore, q).arun(prompt=analysis_prompt) for q in questions
+    ))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the threadpool-bound sync chain with the async chain.")
+    parser.add_argument("--requests", type=int, default=400, help="Number of in-flight questions")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stand-in LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per stand-in embedding call")
+    args = parser.parse_args()
+
+    # The chain logs several lines per stage, keep them out of the measurement
+    logging.disable(logging.CRITICAL)
+
+    llm = StandInChatModel(latency=args.llm_latency)
+    vectorstore = StandInVectorStore(latency=args.search_latency)
+    questions = [f"Stemte Venstre for bompenger i sak {i}?" for i in range(args.requests)]
+
+    sync_seconds = benchmark_sync(llm, vectorstore, questions)
+    async_seconds = asyncio.run(benchmark_async(llm, vectorstore, questions))
+
+    print(f"Questions:          {args.requests}")
+    print(f"Sync (40 threads):  {sync_seconds:.2f}s  ({args.requests / sync_seconds:.1f} questions/s)")
+    print(f"Async (1 loop):     {async_seconds:.2f}s  ({args.requests / async_seconds:.1f} questions/s)")
+    print(f"Speedup:            {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
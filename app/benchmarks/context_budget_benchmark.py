@@ -0,0 +1,107 @@
+import argparse
+import glob
+import logging
+import os
+import random
+import statistics
+import time
+from langchain_core.prompts import PromptTemplate
+from model.response_model import RAGResponse
+from prompts.prompt_manager import analysis_prompt
+from services.context_builder import ContextBuilder, DEFAULT_TOKEN_BUDGET, TOKENIZER_ENCODING, count_tokens, load_tokenizer
+from tools.embedding_tool import EmbeddingTool
+from tools.extraction_worker import BytesUploadFile
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(__file__), "..", "documents")
+QUESTION = "Stemte Venstre for økte bompenger?"
+
+
+def load_chunks(tool: EmbeddingTool, path: str):
+    chunks = tool.create_chunks_from_document(BytesUploadFile.from_path(path))
+
+    for chunk in chunks:
+        chunk.metadata["source"] = os.path.basename(path)
+    return chunks
+
+
+def sample_retrieval(chunks, rng: random.Random, top_k: int):
+    """Ranked results the way fusion returns them: runs of neighbouring chunks mixed with scattered hits."""
+    picked = []
+    while len(picked) < top_k:
+        start = rng.randrange(len(chunks))
+        picked.extend(chunks[start:start + rng.choice((1, 2, 3))])
+    picked = list(dict.fromkeys(id(chunk) for chunk in picked))[:top_k]
+    by_id = {id(chunk): chunk for chunk in chunks}
+    results = [by_id[chunk_id] for chunk_id in picked]
+    rng.shuffle(results)
+    return results
+
+
+def final_input(context) -> dict:
+    return {
+        "context": context,
+        "plan": [],
+        "original_question": QUESTION,
+        "generated_queries_from_plan": [QUESTION]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt size and time-to-answer with raw Document context vs the context builder.")
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10, help="Retrieved documents per trial")
+    parser.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Context token budget")
+    parser.add_argument("--live", action="store_true", help="Also time the final answer against the configured LLM endpoint")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    print(f"Token counts: {TOKENIZER_ENCODING if load_tokenizer() else 'four characters per token estimate'}")
+
+    tool = EmbeddingTool(segmentation="rule")
+    chunks = [chunk for path in sorted(glob.glob(os.path.join(DOCUMENTS_DIR, "*.pdf"))) for chunk in load_chunks(tool, path)]
+    rng = random.Random(args.seed)
+    template = PromptTemplate(
+        input_variables=["context", "plan", "original_question", "generated_queries_from_plan"],
+        template=analysis_prompt
+    )
+    builder = ContextBuilder(token_budget=args.budget)
+
+    chain = None
+    if args.live:
+        from config.openai_config import openapi_client
+        chain = template | openapi_client().with_structured_output(RAGResponse)
+
+    measurements = {"before": {"tokens": [], "seconds": []}, "after": {"tokens": [], "seconds": []}}
+    build_seconds = []
+    for _ in range(args.trials):
+        docs = sample_retrieval(chunks, rng, args.top_k)
+
+        start = time.perf_counter()
+        built = builder.build(docs)
+        build_seconds.append(time.perf_counter() - start)
+
+        # Before: the Document list itself was formatted into the prompt
+        inputs = {"before": final_input(docs), "after": final_input(built.text)}
+        for variant, variant_input in inputs.items():
+            measurements[variant]["tokens"].append(count_tokens(template.format(**variant_input)))
+            if chain is not None:
+                start = time.perf_counter()
+                chain.invoke(variant_input)
+                measurements[variant]["seconds"].append(time.perf_counter() - start)
+
+    print(f"Trials:                 {args.trials} ({args.top_k} documents each, {args.budget} token budget)")
+    print(f"Context build (median): {statistics.median(build_seconds) * 1000:.2f}ms")
+    for variant in ("before", "after"):
+        tokens = measurements[variant]["tokens"]
+        line = f"{variant.capitalize():<7} prompt tokens: median {statistics.median(tokens):.0f}, max {max(tokens)}"
+        if measurements[variant]["seconds"]:
+            line += f", time-to-answer median {statistics.median(measurements[variant]['seconds']):.2f}s"
+        print(line)
+
+    saved = 1 - statistics.median(measurements["after"]["tokens"]) / statistics.median(measurements["before"]["tokens"])
+    print(f"Prompt tokens saved:    {saved:.0%}")
+
+
+if __name__ == "__main__":
+    main()
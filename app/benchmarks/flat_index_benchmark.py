@@ -0,0 +1,111 @@
+import argparse
+import multiprocessing
+import statistics
+import tempfile
+import time
+import numpy as np
+from services.backends.chroma_backend import ChromaBackend
+from services.backends.flat_backend import FlatBackend
+
+# Chroma rejects larger upserts in one call
+WRITE_BATCH = 1000
+
+
+def synthetic_corpus(size: int, dimensions: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """Clustered unit vectors like real chunk embeddings, and queries drawn near the clusters."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(size // 50, 1), dimensions))
+    vectors = centers[rng.integers(len(centers), size=size)] + 0.6 * rng.normal(size=(size, dimensions))
+    queries = centers[rng.integers(len(centers), size=200)] + 0.8 * rng.normal(size=(200, dimensions))
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def write(backend, vectors: np.ndarray):
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    for start in range(0, len(vectors), WRITE_BATCH):
+        end = start + WRITE_BATCH
+        backend.add(
+            ids=ids[start:end],
+            vectors=vectors[start:end].tolist(),
+            documents=[f"chunk {i}" for i in range(start, min(end, len(vectors)))],
+            metadatas=[{"source": "benchmark"} for _ in ids[start:end]]
+        )
+
+
+def open_backend(name: str, directory: str):
+    if name == "flat":
+        return FlatBackend(persist_directory=directory)
+    return ChromaBackend(persist_directory=directory, collection_metadata={"hnsw:space": "cosine"})
+
+
+def cold_start(backend: str, directory: str, query: list[float], k: int, results):
+    # Runs in a fresh process, so nothing is cached in memory but the OS page cache
+    start = time.perf_counter()
+    store = open_backend(backend, directory)
+    store.search_by_vector([query], k=k)
+    results.put(time.perf_counter() - start)
+
+
+def measure_cold_start(backend: str, directory: str, query: list[float], k: int) -> float:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=cold_start, args=(backend, directory, query, k, results))
+    process.start()
+    elapsed = results.get()
+    process.join()
+    return elapsed
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query latency, recall and cold start of the flat index against Chroma.")
+    parser.add_argument("--size", type=int, default=5000, help="Vectors in the corpus")
+    parser.add_argument("--dimensions", type=int, default=1024, help="mxbai-embed-large produces 1024")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    vectors, queries = synthetic_corpus(args.size, args.dimensions, args.seed)
+    query_list = queries.tolist()
+
+    with tempfile.TemporaryDirectory() as chroma_directory, tempfile.TemporaryDirectory() as flat_directory:
+        directories = {"chroma": chroma_directory, "flat": flat_directory}
+        stores = {}
+        for backend, directory in directories.items():
+            start = time.perf_counter()
+            stores[backend] = open_backend(backend, directory)
+            write(stores[backend], vectors)
+            print(f"{backend:<7} build:      {time.perf_counter() - start:.2f}s for {args.size} vectors")
+
+        results = {}
+        for backend, store in stores.items():
+            latencies = []
+            found = []
+            for query in query_list:
+                start = time.perf_counter()
+                hits = store.search_by_vector([query], k=args.k)[0]
+                latencies.append(time.perf_counter() - start)
+                found.append({document.page_content for document, _ in hits})
+            results[backend] = found
+            print(f"{backend:<7} query:      p50 {statistics.median(latencies) * 1000:.2f}ms, p99 {percentile(latencies, 0.99) * 1000:.2f}ms")
+
+        start = time.perf_counter()
+        stores["flat"].search_by_vector(query_list, k=args.k)
+        print(f"flat    batch:      {(time.perf_counter() - start) * 1000:.2f}ms for all {len(query_list)} queries")
+
+        # The flat index is exact, so it is the ground truth for Chroma's approximate HNSW search
+        recall = statistics.mean(
+            len(approximate & exact) / len(exact) for approximate, exact in zip(results["chroma"], results["flat"]) if exact
+        )
+        print(f"chroma  recall@{args.k}:   {recall:.3f}")
+
+        for backend, directory in directories.items():
+            print(f"{backend:<7} cold start: {measure_cold_start(backend, directory, query_list[0], args.k) * 1000:.0f}ms (open + first query)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+import time
+from services.vector_store import QUOTE_PATTERN
+from tools.embedding_tool import EmbeddingTool
+from tools.extraction_worker import BytesUploadFile
+
+DEFAULT_PDF = os.path.join(os.path.dirname(__file__), "..", "documents", "venstre-stortingsprogram-2025.pdf")
+
+
+def two_pass(tool: EmbeddingTool, upload: BytesUploadFile):
+    """The previous ingestion path, parsing and cleaning the file once per collection."""
+    upload.file.seek(0)
+    chunks = tool.create_chunks_from_document(file=upload, chunk_size=1000)
+    upload.file.seek(0)
+    quotes = tool.create_chunks_from_pattern(file=upload, pattern=QUOTE_PATTERN)
+    return chunks, quotes
+
+
+def single_pass(tool: EmbeddingTool, upload: BytesUploadFile):
+    upload.file.seek(0)
+    return tool.create_chunks_and_pattern_matches(file=upload, pattern=QUOTE_PATTERN, chunk_size=1000)
+
+
+def measure(fn, tool, upload, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(tool, upload)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two-pass and single-pass PDF ingestion parsing.")
+    parser.add_argument("--pdf", default=DEFAULT_PDF, help="PDF to ingest")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant, the fastest is reported")
+    args = parser.parse_args()
+
+    tool = EmbeddingTool()
+    upload = BytesUploadFile.from_path(args.pdf)
+    two_pass_seconds, (chunks, quotes) = measure(two_pass, tool, upload, args.repeat)
+    single_pass_seconds, (single_chunks, single_quotes) = measure(single_pass, tool, upload, args.repeat)
+
+    same_output = [c.page_content for c in chunks] == [c.page_content for c in single_chunks] \
+        and [q.page_content for q in quotes] == [q.page_content for q in single_quotes]
+
+    print(f"Document:     {upload.filename}")
+    print(f"Chunks:       {len(single_chunks)}, quotes: {len(single_quotes)}")
+    print(f"Two-pass:     {two_pass_seconds:.2f}s")
+    print(f"Single-pass:  {single_pass_seconds:.2f}s")
+    print(f"Speedup:      {two_pass_seconds / single_pass_seconds:.2f}x")
+    print(f"Same output:  {same_output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from langchain.docstore.document import Document
+from benchmarks.stand_ins import StandInChatModel, StandInEmbeddings
+from prompts.prompt_manager import analysis_prompt
+from services.rag_service import RagService, RETRIEVAL_K, RETRIEVAL_TOP_K
+from services.vector_store import VectorStore, QUOTE_PATTERN
+from tools.embedding_tool import EmbeddingTool
+from tools.extraction_worker import BytesUploadFile
+from tools.relevance_filter import RelevanceFilter
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(__file__), "..", "documents")
+
+QUESTIONS = [
+    "Hva mener Venstre om bompenger?",
+    "Hvordan vil Venstre styrke kollektivtransporten?",
+    "Hva er Venstres klimapolitikk?",
+    "Hva vil Venstre gjøre med skatt for småbedrifter?",
+    "Hvordan vil Venstre forbedre skolen?",
+    "Hva mener Venstre om personvern?",
+    "Hva vil Venstre gjøre for distriktene?",
+    "Hvordan vil Venstre sikre naturmangfold?",
+]
+
+
+def percentiles(values: list[float]) -> dict:
+    ordered = sorted(values)
+    def at(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        "samples": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": at(0.50) * 1000,
+        "p95_ms": at(0.95) * 1000,
+        "p99_ms": at(0.99) * 1000,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_extraction(tool: EmbeddingTool, pdfs: list[str]) -> tuple[dict, list[tuple[str, list[tuple[str, Document]]]]]:
+    """Time PDF text extraction and the cleaning and chunking that follows it, per document."""
+    documents = []
+    results = {}
+    for path in pdfs:
+        with open(path, "rb") as f:
+            upload = BytesUploadFile(os.path.basename(path), f.read())
+
+        start = time.perf_counter()
+        pages = list(tool.iter_pages(upload))
+        extraction_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chunks = list(tool.iter_chunks_and_pattern_matches(file=upload, pattern=QUOTE_PATTERN, chunk_size=1000, pages=pages))
+        cleaning_seconds = time.perf_counter() - start
+
+        characters = sum(len(page) for page in pages)
+        results[os.path.basename(path)] = {
+            "pages": len(pages),
+            "characters": characters,
+            "chunks": sum(1 for kind, _ in chunks if kind == "chunk"),
+            "quotes": sum(1 for kind, _ in chunks if kind == "quote"),
+            "extraction_seconds": extraction_seconds,
+            "extraction_pages_per_second": len(pages) / extraction_seconds if extraction_seconds else 0.0,
+            "cleaning_seconds": cleaning_seconds,
+            "cleaning_characters_per_second": characters / cleaning_seconds if cleaning_seconds else 0.0,
+        }
+        documents.append((os.path.basename(path), chunks))
+    return results, documents
+
+
+def benchmark_ingestion(vectorstore: VectorStore, documents: list[tuple[str, list[tuple[str, Document]]]]) -> dict:
+    start = time.perf_counter()
+    reports = [report for source, chunks in documents for report in vectorstore.ingest_documents(source=source, embedding_type="both", documents=chunks)]
+    seconds = time.perf_counter() - start
+    written = sum(report.new for report in reports)
+    return {
+        "documents": len(documents),
+        "chunks_written": written,
+        "seconds": seconds,
+        "chunks_per_second": written / seconds if seconds else 0.0,
+    }
+
+
+def benchmark_retrieval(vectorstore: VectorStore, queries: list[str], rounds: int) -> dict:
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            vectorstore.search_collections(queries=[query], k=RETRIEVAL_K, top_k=RETRIEVAL_TOP_K)
+            latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def build_service(llm: StandInChatModel, vectorstore: VectorStore, question: str) -> RagService:
+    return RagService() \
+        .with_vectorstore(vectorstore) \
+        .with_llm(model=llm, embeddings=None, temperature=0) \
+        .with_anonymized_planning() \
+        .with_relevance_filter(RelevanceFilter()) \
+        .with_question(question=question)
+
+
+def benchmark_end_to_end(llm: StandInChatModel, vectorstore: VectorStore, questions: list[str], rounds: int) -> dict:
+    """RagService.run latency, then the same runs again under tracemalloc for their allocations."""
+    latencies = []
+    for _ in range(rounds):
+        for question in questions:
+            start = time.perf_counter()
+            build_service(llm, vectorstore, question).run(prompt=analysis_prompt)
+            latencies.append(time.perf_counter() - start)
+
+    # tracemalloc slows every allocation down, so it is kept out of the latency runs
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for question in questions:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            build_service(llm, vectorstore, question).run(prompt=analysis_prompt)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        **percentiles(latencies),
+        "peak_allocated_bytes_mean": statistics.mean(peaks),
+        "peak_allocated_bytes_max": max(peaks),
+        "retained_bytes_mean": statistics.mean(retained),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline extraction, ingestion, retrieval and end-to-end benchmarks with JSON output.")
+    parser.add_argument("--segmentation", default="parser", help="spaCy segmentation mode for cleaning")
+    parser.add_argument("--dimensions", type=int, default=384, help="Size of the hashed stand-in embeddings")
+    parser.add_argument("--rounds", type=int, default=20, help="Times each query and question is repeated")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    # The chain logs several lines per stage, keep them out of the measurement
+    logging.disable(logging.CRITICAL)
+
+    pdfs = sorted(glob.glob(os.path.join(DOCUMENTS_DIR, "*.pdf")))
+    tool = EmbeddingTool(segmentation=args.segmentation)
+    extraction, documents = benchmark_extraction(tool, pdfs)
+
+    llm = StandInChatModel()
+    vectorstore = VectorStore.in_memory()
+    vectorstore.initialize(llm=llm, embeddings=StandInEmbeddings(dimensions=args.dimensions))
+    ingestion = benchmark_ingestion(vectorstore, documents)
+
+    # Questions plus the quotes themselves, so some queries have near-exact matches
+    quotes = [document.page_content for _, chunks in documents for kind, document in chunks if kind == "quote"]
+    retrieval = benchmark_retrieval(vectorstore, QUESTIONS + quotes[:len(QUESTIONS)], args.rounds)
+    end_to_end = benchmark_end_to_end(llm, vectorstore, QUESTIONS, args.rounds)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "extraction": extraction,
+        "ingestion": ingestion,
+        "retrieval": retrieval,
+        "end_to_end": end_to_end,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    for name, document in extraction.items():
+        print(f"{name:<36} {document['pages']:>4} pages, extract {document['extraction_pages_per_second']:.1f} pages/s, clean {document['cleaning_characters_per_second'] / 1000:.0f}k chars/s")
+    print(f"Ingestion:   {ingestion['chunks_written']} chunks at {ingestion['chunks_per_second']:.0f} chunks/s")
+    print(f"Retrieval:   p50 {retrieval['p50_ms']:.2f}ms, p99 {retrieval['p99_ms']:.2f}ms")
+    print(f"End to end:  p50 {end_to_end['p50_ms']:.2f}ms, p99 {end_to_end['p99_ms']:.2f}ms, peak {end_to_end['peak_allocated_bytes_mean'] / 1024:.0f} KiB per run")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
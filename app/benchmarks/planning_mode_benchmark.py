@@ -0,0 +1,146 @@
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from benchmarks.stand_ins import StandInChatModel, StandInVectorStore
+from services.rag_service import RagService
+
+DEFAULT_QUESTIONS = [
+    "Stemte Venstre for økte bompenger?",
+    "Er Arbeiderpartiets stemme om formuesskatt i tråd med partiprogrammet?",
+    "Støttet Fremskrittspartiet forslaget om strengere innvandringsregler?",
+    "Stemte SV for å stanse oljeleting i Barentshavet?",
+    "Er Høyres stemme om sykehusreformen i samsvar med programmet deres?",
+]
+
+PLANNING_MODES = ("anonymized", "fast")
+
+
+def build_service(llm, vectorstore, question: str, mode: str) -> RagService:
+    service = RagService() \
+        .with_vectorstore(vectorstore) \
+        .with_llm(model=llm, embeddings=None, temperature=0) \
+        .with_question(question=question)
+
+    return service.with_fast_planning() if mode == "fast" else service.with_anonymized_planning()
+
+
+async def plan_and_retrieve(llm, vectorstore, question: str, mode: str, k: int) -> dict:
+    service = build_service(llm, vectorstore, question, mode)
+
+    start = time.perf_counter()
+    if mode == "fast":
+        await service.acreate_fast_plan()
+    else:
+        await service.acreate_queries_from_plan()
+    planning_seconds = time.perf_counter() - start
+
+    retrieved = await vectorstore.asearch_collections(queries=service.queries, k=k)
+    documents = {document.page_content for collection in retrieved.values() for document in collection}
+
+    return {
+        "planning_seconds": planning_seconds,
+        "steps": service.plan_obj.steps,
+        "queries": service.queries,
+        "documents": documents
+    }
+
+
+def overlap(reference: set, candidate: set) -> tuple[float | None, float | None]:
+    """Jaccard overlap of the two retrieved sets and the share of the reference documents the candidate also found."""
+    if not reference and not candidate:
+        return None, None
+
+    jaccard = len(reference & candidate) / len(reference | candidate)
+    recall = len(reference & candidate) / len(reference) if reference else None
+    return jaccard, recall
+
+
+def format_ratio(value: float | None) -> str:
+    return f"{value:.2f}" if value is not None else "n/a"
+
+
+async def compare(llm, vectorstore, questions: list[str], k: int) -> list[dict]:
+    rows = []
+    for question in questions:
+        results = {mode: await plan_and_retrieve(llm, vectorstore, question, mode, k) for mode in PLANNING_MODES}
+        jaccard, recall = overlap(results["anonymized"]["documents"], results["fast"]["documents"])
+        rows.append({
+            "question": question,
+            "anonymized_seconds": results["anonymized"]["planning_seconds"],
+            "fast_seconds": results["fast"]["planning_seconds"],
+            "anonymized_queries": results["anonymized"]["queries"],
+            "fast_queries": results["fast"]["queries"],
+            "anonymized_steps": results["anonymized"]["steps"],
+            "fast_steps": results["fast"]["steps"],
+            "retrieval_jaccard": jaccard,
+            "retrieval_recall": recall
+        })
+    return rows
+
+
+def build_live_backends():
+    from config.openai_config import openapi_client
+    from langchain_ollama import OllamaEmbeddings
+    from services.vector_store import VectorStore
+    from tools.cached_embeddings import CachedEmbeddings
+
+    llm = openapi_client()
+    vectorstore = VectorStore()
+    vectorstore.initialize(llm=llm, embeddings=CachedEmbeddings(OllamaEmbeddings(model="mxbai-embed-large")))
+    return llm, vectorstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the four-stage anonymized planning chain with the single-call fast planner.")
+    parser.add_argument("--questions-file", help="File with one question per line, defaults to a small built-in set")
+    parser.add_argument("--live", action="store_true", help="Use the configured LLM endpoint, Ollama and Chroma instead of stand-ins")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per stand-in LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Seconds per stand-in embedding call")
+    parser.add_argument("--k", type=int, default=5, help="Documents retrieved per query and collection")
+    parser.add_argument("--output", help="Write the per-question results as JSON to this path")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    if args.live:
+        llm, vectorstore = build_live_backends()
+    else:
+        llm = StandInChatModel(latency=args.llm_latency)
+        vectorstore = StandInVectorStore(latency=args.search_latency)
+
+    rows = asyncio.run(compare(llm, vectorstore, questions, args.k))
+
+    for row in rows:
+        print(row["question"])
+        print(f"  anonymized: {row['anonymized_seconds']:.2f}s, {len(row['anonymized_queries'])} queries")
+        print(f"  fast:       {row['fast_seconds']:.2f}s, {len(row['fast_queries'])} queries")
+        print(f"  retrieval overlap: jaccard {format_ratio(row['retrieval_jaccard'])}, recall {format_ratio(row['retrieval_recall'])}")
+
+    anonymized_seconds = [row["anonymized_seconds"] for row in rows]
+    fast_seconds = [row["fast_seconds"] for row in rows]
+    recalls = [row["retrieval_recall"] for row in rows if row["retrieval_recall"] is not None]
+
+    print()
+    print(f"Questions:               {len(rows)}")
+    print(f"Anonymized chain median: {statistics.median(anonymized_seconds):.2f}s")
+    print(f"Fast planner median:     {statistics.median(fast_seconds):.2f}s")
+    print(f"Speedup:                 {statistics.median(anonymized_seconds) / statistics.median(fast_seconds):.1f}x")
+    print(f"Mean retrieval recall:   {format_ratio(statistics.mean(recalls) if recalls else None)}")
+    if not args.live:
+        print("Stand-in outputs are canned, only the latency numbers are meaningful without --live")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
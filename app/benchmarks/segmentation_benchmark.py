@@ -0,0 +1,75 @@
+import argparse
+import glob
+import os
+import re
+import time
+import spacy
+from tools.embedding_tool import EmbeddingTool, PRE_CLEAN_PATTERNS, SEGMENTATION_MODES, SPACY_MODEL
+from tools.extraction_worker import BytesUploadFile
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(__file__), "..", "documents")
+
+
+def read_raw_text(tool: EmbeddingTool, path: str) -> str:
+    return tool.get_document_as_text(BytesUploadFile.from_path(path))
+
+
+def baseline_clean_text(nlp, text: str) -> str:
+    """The original cleaner: pre-clean, one nlp() call over the whole text, join the sentences."""
+    for pattern, replacement in PRE_CLEAN_PATTERNS:
+        text = pattern.sub(replacement, text)
+    # The single pass needs the whole document in one Doc
+    nlp.max_length = max(nlp.max_length, len(text) + 1)
+    result = ""
+    for sent in nlp(text).sents:
+        sentence = sent.text.strip()
+        if sentence and not sentence.endswith(('.', '!', '?', ':')):
+            sentence += '.'
+        result += sentence + ' '
+
+    return re.sub(r' +', ' ', result.strip())
+
+
+def sentence_overlap(reference: str, candidate: str) -> float:
+    """Jaccard overlap of the period-terminated sentences in both texts."""
+    reference_sentences = set(reference.split(". "))
+    candidate_sentences = set(candidate.split(". "))
+    union = reference_sentences | candidate_sentences
+    return len(reference_sentences & candidate_sentences) / len(union) if union else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and output parity of the sentence segmentation modes.")
+    parser.add_argument("--modes", nargs="+", default=list(SEGMENTATION_MODES), choices=SEGMENTATION_MODES)
+    parser.add_argument("--processes", type=int, default=1, help="n_process for nlp.pipe")
+    parser.add_argument("--window-chars", type=int, default=50000)
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(DOCUMENTS_DIR, "*.pdf")))
+    reader = EmbeddingTool(segmentation="rule")
+    raw_texts = {os.path.basename(path): read_raw_text(reader, path) for path in pdfs}
+
+    # The single-pass cleaner with the complete pipeline is what every mode is compared against
+    baseline_nlp = spacy.load(SPACY_MODEL)
+    references = {}
+    print(f"{'mode':<8} {'document':<36} {'seconds':>8} {'chars/s':>10} {'identical':>10} {'overlap':>8}")
+    for name, raw_text in raw_texts.items():
+        start = time.perf_counter()
+        references[name] = baseline_clean_text(baseline_nlp, raw_text)
+        seconds = time.perf_counter() - start
+        print(f"{'baseline':<8} {name:<36} {seconds:>8.2f} {len(raw_text) / seconds:>10.0f} {'-':>10} {'-':>8}")
+
+    for mode in args.modes:
+        tool = EmbeddingTool(segmentation=mode, n_process=args.processes, window_chars=args.window_chars)
+        for name, raw_text in raw_texts.items():
+            start = time.perf_counter()
+            cleaned = tool.clean_text(raw_text)
+            seconds = time.perf_counter() - start
+
+            reference = references[name]
+            print(f"{mode:<8} {name:<36} {seconds:>8.2f} {len(raw_text) / seconds:>10.0f} "
+                  f"{str(cleaned == reference):>10} {sentence_overlap(reference, cleaned):>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
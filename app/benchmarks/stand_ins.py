@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from services.backends.memory_backend import InMemoryBackend
+from services.vector_store import COLLECTIONS, VectorStore
+from model.anonymize_model import AnonymizedQuestion
+from model.plan_model import Plan
+from model.queries_from_plan import QueriesFromPlan
+from model.fast_plan_model import FastPlan
+from model.response_model import RAGResponse
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Policy sentences the stand-in vector store starts with
+STAND_IN_DOCUMENTS = [
+    "Venstre vil redusere bruken av bompenger og heller finansiere veier over statsbudsjettet.",
+    "Venstre vil bygge ut kollektivtrafikken i de store byene.",
+    "Sykkelveier og gange skal prioriteres foran nye motorveier i byområdene.",
+    "Venstre vil senke formuesskatten på arbeidende kapital.",
+    "Skolen skal ha flere lærere og færre nasjonale prøver.",
+    "Klimagassutslippene skal kuttes med minst 55 prosent innen 2030.",
+]
+
+# Canned structured outputs, one per schema the RAG chain asks for
+CANNED_OUTPUTS = {
+    AnonymizedQuestion: lambda: AnonymizedQuestion(
+        anonymized_question="Stemte X for Y?",
+        mapping={"X": "Venstre", "Y": "bompenger"},
+        explaination="Stand-in anonymization"
+    ),
+    Plan: lambda: Plan(steps=[
+        "Finn Venstres standpunkt om bompenger",
+        "Sammenlign standpunktet med stemmegivningen"
+    ]),
+    QueriesFromPlan: lambda: QueriesFromPlan(queries=[
+        "Venstre bompenger standpunkt",
+        "Venstre samferdsel finansiering vei",
+        "Venstre stemmegivning bompenger Stortinget"
+    ]),
+    FastPlan: lambda: FastPlan(
+        steps=[
+            "Finn Venstres standpunkt om bompenger",
+            "Sammenlign standpunktet med stemmegivningen"
+        ],
+        queries=[
+            "Venstre bompenger standpunkt",
+            "Venstre stemmegivning bompenger Stortinget"
+        ]
+    ),
+    RAGResponse: lambda: RAGResponse(
+        does_match=True,
+        explanation="Stand-in analyse",
+        relevant_context=["Venstre vil redusere bompenger."]
+    ),
+}
+
+
+class StandInChatModel(BaseChatModel):
+    """Deterministic offline chat model, a drop-in for ChatOpenAI in the RAG chain.
+
+    Structured calls return the canned output for the requested schema, plain calls echo
+    a fixed answer. latency simulates the round-trip of a real endpoint.
+    """
+
+    model_name: str = "stand-in-llm"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="Stand-in svar."))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="Stand-in svar."))])
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs: Any):
+        def respond(_):
+            if self.latency:
+                time.sleep(self.latency)
+            return CANNED_OUTPUTS[schema]()
+
+        async def arespond(_):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return CANNED_OUTPUTS[schema]()
+
+        return RunnableLambda(respond, afunc=arespond)
+
+
+class StandInEmbeddings(Embeddings):
+    """Deterministic offline embedder, a drop-in for OllamaEmbeddings.
+
+    Words are hashed into a fixed number of signed buckets, so texts that share words
+    get similar vectors and retrieval results stay meaningful without a model. latency is
+    one fixed delay per call regardless of batch size, like one round-trip to Ollama.
+    """
+
+    def __init__(self, dimensions: int = 384, latency: float = 0.0):
+        self.model = f"hashed-{dimensions}"
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class StandInCollection(InMemoryBackend):
+    """In-memory backend with a fixed search delay per query, like a round-trip to Chroma."""
+
+    def __init__(self, latency: float = 0.01):
+        super().__init__()
+        self.latency = latency
+
+    def search_by_vector(self, vectors, k: int = 5):
+        if self.latency:
+            time.sleep(self.latency * len(vectors))
+        return super().search_by_vector(vectors, k=k)
+
+
+class StandInVectorStore(VectorStore):
+    """VectorStore on stand-in embeddings and collections instead of Ollama and Chroma, seeded with STAND_IN_DOCUMENTS."""
+
+    def __init__(self, latency: float = 0.05):
+        super().__init__(
+            backends={collection: StandInCollection(latency=latency / 5) for collection in COLLECTIONS},
+            lexical_directory=None
+        )
+        embeddings = StandInEmbeddings()
+        self.initialize(llm=None, embeddings=embeddings)
+        self.ingest_documents(
+            source="stand-in.pdf",
+            embedding_type="both",
+            documents=[("chunk", Document(page_content=text)) for text in STAND_IN_DOCUMENTS]
+                + [("quote", Document(page_content=text)) for text in STAND_IN_DOCUMENTS if text.startswith("Venstre vil")]
+        )
+        # Seeded without delay, searches pay one embedding round-trip per call
+        embeddings.latency = latency
@@ -0,0 +1,43 @@
+from services.bm25_index import BM25Index
+
+
+def test_bm25_finds_exact_terms_and_skips_documents_without_them():
+    index = BM25Index()
+    index.add(
+        ids=["toll", "school", "both"],
+        texts=[
+            "Venstre vil fjerne bompenger på riksveier.",
+            "Skolen skal ha flere lærere.",
+            "Bompenger og skole er viktige saker, bompenger aller mest.",
+        ],
+        metadatas=[{}, {"source": "program.pdf"}, {}]
+    )
+
+    results = index.search("bompenger", k=5)
+
+    assert [document.id for document, _ in results] == ["both", "toll"]
+    assert results[0][1] > results[1][1]
+
+
+def test_bm25_ignores_stopwords_and_deleted_documents():
+    index = BM25Index()
+    index.add(ids=["a", "b"], texts=["og det er formuesskatt", "og det er klima"], metadatas=[{}, {}])
+
+    assert index.search("og det er", k=5) == []
+
+    index.delete(["a"])
+    assert index.count() == 1
+    assert index.search("formuesskatt", k=5) == []
+
+
+def test_bm25_round_trips_through_disk(tmp_path):
+    path = tmp_path / "chunk.json"
+    index = BM25Index(path=str(path))
+    index.add(ids=["a"], texts=["Venstre vil senke formuesskatten"], metadatas=[{"source": "program.pdf"}])
+    index.save()
+
+    loaded = BM25Index.load(str(path))
+    [(document, _)] = loaded.search("formuesskatten", k=5)
+
+    assert document.id == "a"
+    assert document.metadata == {"source": "program.pdf"}
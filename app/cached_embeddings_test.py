@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from tools.cached_embeddings import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    """One-dimensional embeddings that record every text they are asked to embed."""
+
+    model = "counting"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+def test_memory_tier_is_bounded_and_evicts_the_least_recently_used():
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, cache_path=None, max_memory_entries=2)
+
+    cached.embed_documents(["a", "bb"])
+    cached.embed_query("a")
+    cached.embed_query("ccc")
+    cached.embed_documents(["a", "bb"])
+
+    # "bb" was the least recently used when "ccc" came in, so only it is embedded again
+    assert inner.embedded == ["a", "bb", "ccc", "bb"]
+    assert cached.stats()["memory_entries"] == 2
+
+
+def test_duplicate_texts_in_one_call_are_embedded_once():
+    inner = CountingEmbeddings()
+    cached = CachedEmbeddings(inner, cache_path=None)
+
+    assert cached.embed_documents(["a", " a ", "a"]) == [[1.0], [1.0], [1.0]]
+    assert inner.embedded == ["a"]
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    CachedEmbeddings(CountingEmbeddings(), cache_path=path).embed_documents(["a", "bb"])
+
+    inner = CountingEmbeddings()
+    reopened = CachedEmbeddings(inner, cache_path=path)
+
+    assert asyncio.run(reopened.aembed_documents(["bb", "a"])) == [[2.0], [1.0]]
+    assert inner.embedded == []
+    assert reopened.stats()["disk_hits"] == 2
+    # Loaded into memory, the next lookup does not touch disk
+    reopened.embed_query("a")
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_memory_hits_do_not_wait_for_the_sqlite_connection(tmp_path):
+    cached = CachedEmbeddings(CountingEmbeddings(), cache_path=str(tmp_path / "cache.sqlite"))
+    cached.embed_query("a")
+    done = threading.Event()
+
+    with cached._connection_lock:
+        # Stands in for a slow SQLite read or write on another thread
+        threading.Thread(target=lambda: (cached.embed_query("a"), done.set())).start()
+        assert done.wait(timeout=2)
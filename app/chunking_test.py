@@ -0,0 +1,43 @@
+import glob
+import os
+import pytest
+from tools.embedding_tool import EmbeddingTool
+from tools.extraction_worker import BytesUploadFile
+
+DOCUMENTS_DIR = os.path.join(os.path.dirname(__file__), "documents")
+PDFS = sorted(glob.glob(os.path.join(DOCUMENTS_DIR, "*.pdf")))
+
+
+@pytest.fixture(scope="module")
+def tool():
+    # The rule-based sentencizer needs no downloaded spaCy model
+    return EmbeddingTool(segmentation="rule")
+
+
+def chunk_texts(documents) -> list[str]:
+    return [document.page_content for document in documents]
+
+
+@pytest.mark.parametrize("path", PDFS, ids=os.path.basename)
+def test_iter_chunks_matches_split_text_on_bundled_pdfs(tool, path):
+    with open(path, "rb") as f:
+        upload = BytesUploadFile(os.path.basename(path), f.read())
+    segments = list(tool.iter_cleaned_segments(tool.iter_pages(upload)))
+
+    streamed = chunk_texts(tool.iter_chunks(iter(segments)))
+
+    assert streamed
+    assert streamed == chunk_texts(tool.split_text_into_chunks(" ".join(segments)))
+
+
+@pytest.mark.parametrize("chunk_size", [300, 1000])
+def test_iter_chunks_matches_split_text_for_many_small_segments(tool, chunk_size):
+    segments = [f"Setning nummer {i} handler om skole, samferdsel og klima i Norge." for i in range(500)]
+
+    streamed = chunk_texts(tool.iter_chunks(iter(segments), chunk_size=chunk_size))
+
+    assert streamed == chunk_texts(tool.split_text_into_chunks(" ".join(segments), chunk_size=chunk_size))
+
+
+def test_iter_chunks_of_short_text_is_one_chunk(tool):
+    assert chunk_texts(tool.iter_chunks(iter(["Kort tekst."]))) == ["Kort tekst."]
@@ -0,0 +1,160 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+LOG_FORMATS = ("json", "rich")
+
+# Id of the request being handled, None outside of one. Each request runs in its own
+# context, so concurrent requests never see each other's id.
+current_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Rich style tags like [bold green] or [/bold green]. At least one style word is required, so
+# bracketed log content such as "[]" or generated queries is kept.
+STYLE_WORDS = r"(?:bold|dim|italic|underline|red|green|blue|yellow|magenta|cyan|white)"
+RICH_MARKUP = re.compile(rf"\[/?{STYLE_WORDS}(?: {STYLE_WORDS})*\]")
+
+
+class RequestIdFilter(logging.Filter):
+    """Copies the request id onto the record while still on the logging thread, before it is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id.get()
+        return True
+
+
+class RequestQueueHandler(QueueHandler):
+    """Enqueues records with the request id and the merged message, leaving the rest to the listener.
+
+    Only the %-merge happens on the logging thread, since the arguments may change once the call
+    returns. Markup stripping, JSON encoding and the write happen on the listener thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.addFilter(RequestIdFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames, render them now instead of sending them to another thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the timestamp, level, logger, request id and plain message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": RICH_MARKUP.sub("", record.getMessage()),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class JsonLoggingSetup:
+    """JSON lines on stdout, written by a listener thread so request threads only enqueue records."""
+
+    def __init__(self):
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, stream_handler, respect_handler_level=True)
+        self.setup_logging()
+
+    def setup_logging(self):
+        queue_handler = RequestQueueHandler(self.queue)
+
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.handlers.clear()
+        root_logger.addHandler(queue_handler)
+
+        for logger_name in ["uvicorn", "uvicorn.access", "uvicorn.error"]:
+            logger = logging.getLogger(logger_name)
+            logger.handlers.clear()
+            logger.propagate = True
+
+        # Silence noisy loggers
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        logging.getLogger("chromadb.telemetry.product.posthog").setLevel(logging.WARNING)
+        logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
+        self.listener.start()
+        # Flush whatever is still queued when the process exits
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.stop()
+
+    def log_startup_banner(self):
+        logging.getLogger("ApplicationService").info("RAG application starting with JSON logging")
+
+
+def setup_logging(log_format: str | None = None):
+    """Configure logging from LOG_FORMAT: "json" (default) for production, "rich" for local development."""
+    log_format = log_format or os.environ.get("LOG_FORMAT", "json")
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"LOG_FORMAT must be one of {LOG_FORMATS}, got {log_format}")
+
+    if log_format == "rich":
+        # Rich is only imported, and its traceback hook only installed, in the dev mode
+        from config.rich_logging_setup import RichLoggingSetup, RichLoggingMiddleware
+        return RichLoggingSetup(), RichLoggingMiddleware
+    return JsonLoggingSetup(), RequestLoggingMiddleware
+
+
+def bind_request_id(request: Request) -> str:
+    """Use the caller's X-Request-ID or generate one, and make it the id of the current context."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    current_request_id.set(request_id)
+    return request_id
+
+
+class RequestLoggingMiddleware(BaseHTTPMiddleware):
+    """Logs the start and end of every request with its id, and returns the id as X-Request-ID."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.logger = logging.getLogger("LoggingAspect")
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.perf_counter()
+        request_id = bind_request_id(request)
+        self.logger.info("--> %s %s", request.method, request.url.path)
+
+        try:
+            response = await call_next(request)
+        except Exception:
+            self.logger.exception("<-- %s %s (%dms) 500", request.method, request.url.path, (time.perf_counter() - start_time) * 1000)
+            raise
+
+        self.logger.info("<-- %s %s (%dms) %d", request.method, request.url.path, (time.perf_counter() - start_time) * 1000, response.status_code)
+        response.headers["X-Request-ID"] = request_id
+        return response
@@ -0,0 +1,145 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# Prometheus' default buckets, extended for multi-second LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (stage, seconds) of the current request, None outside of one. Tasks and to_thread copy the
+# context, so spans from concurrent lookups land in the same list.
+_request_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """A Prometheus histogram with one set of cumulative buckets per label combination."""
+
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...], buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Bucket counts, then sum and count
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms: dict[str, Histogram] = {}
+
+    def histogram(self, name: str, description: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(name, description, label_names, buckets)
+        return self._histograms[name]
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(line for histogram in self._histograms.values() for line in histogram.render()) + "\n"
+
+
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram("rag_stage_duration_seconds", "Duration of one pipeline stage.", ("stage",))
+REQUEST_SECONDS = registry.histogram("rag_request_duration_seconds", "Duration of one HTTP request.", ("method", "path", "status"))
+
+
+@contextmanager
+def span(stage: str):
+    """Time the block into the stage histogram and, inside a request, its Server-Timing header."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+def record_span(stage: str, seconds: float):
+    """Record a duration measured elsewhere, e.g. by a worker process with its own registry."""
+    STAGE_SECONDS.observe(seconds, stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def collect_spans():
+    """Collect the spans of the block into a list, for processes whose registry /metrics never serves."""
+    spans: list[tuple[str, float]] = []
+    token = _request_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _request_spans.reset(token)
+
+
+def server_timing(spans: list[tuple[str, float]], total: float) -> str:
+    """Spans summed per stage, in the order they first finished, e.g. "retrieve;dur=12.3, total;dur=80.1"."""
+    durations: dict[str, float] = {}
+    calls: dict[str, int] = {}
+    for stage, elapsed in spans:
+        durations[stage] = durations.get(stage, 0.0) + elapsed
+        calls[stage] = calls.get(stage, 0) + 1
+
+    entries = [
+        f'{stage};dur={seconds * 1000:.1f}' + (f';desc="{calls[stage]} calls"' if calls[stage] > 1 else "")
+        for stage, seconds in durations.items()
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Collects the spans of each request into a Server-Timing header and the request histogram."""
+
+    async def dispatch(self, request: Request, call_next):
+        spans: list[tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            # Streamed bodies are still running here, their later spans only reach the histograms
+            response.headers["Server-Timing"] = server_timing(list(spans), time.perf_counter() - start)
+            return response
+        finally:
+            # The route template, so path parameters and unknown paths do not each get a series
+            path = getattr(request.scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, path, str(status))
+            _request_spans.reset(token)
@@ -3,6 +3,7 @@ import sys
 import time
 from datetime import datetime
 from typing import Any, Dict, Optional
+from config.logging_setup import RICH_MARKUP, bind_request_id, current_request_id
 
 # FastAPI imports with error handling
 try:
@@ -30,15 +31,9 @@ except ImportError as e:
     print("📦 Install with: pip install rich")
     sys.exit(1)
 
-# Install rich traceback handler for beautiful error traces
-install(show_locals=True)
-
 class IndentedFormatter(logging.Formatter):
     """Custom formatter that handles indentation properly for messages between request start and end"""
     
-    # Class variable to track if we're currently inside a request
-    _inside_request = False
-    
     def __init__(self, fmt):
         super().__init__(fmt)
         self.base_fmt = fmt
@@ -59,18 +54,13 @@ class IndentedFormatter(logging.Formatter):
         record.args = ()
         
         try:
-            # Check if this is a request start (LoggingAspect with -->)
-            if record.name == "LoggingAspect" and message.startswith('-->'):
-                IndentedFormatter._inside_request = True
-                return super().format(record)
-            
-            # Check if this is a request end (LoggingAspect with <--)
-            elif record.name == "LoggingAspect" and message.startswith('<--'):
-                IndentedFormatter._inside_request = False
+            # Request start and end lines (LoggingAspect with --> or <--) are not indented
+            if record.name == "LoggingAspect" and RICH_MARKUP.sub('', message).startswith(('-->', '<--')):
                 return super().format(record)
             
-            # If we're inside a request, indent all messages (except empty ones)
-            elif IndentedFormatter._inside_request and message:
+            # If the record was logged inside a request, indent it (except empty ones).
+            # The id comes from the logging thread's context, so concurrent requests don't interfere.
+            elif current_request_id.get() is not None and message:
                 # Add request indentation to the processed message
                 indented_message = self._add_request_indentation(processed_message)
                 record.msg = indented_message
@@ -122,6 +112,8 @@ class RichLoggingSetup:
     
     def __init__(self):
         self.console = Console()
+        # Install rich traceback handler for beautiful error traces
+        install(show_locals=True)
         self.setup_logging()
     
     def setup_logging(self):
@@ -186,6 +178,7 @@ class RichLoggingMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next):
         start_time = time.time()
+        request_id = bind_request_id(request)
         
         # Log incoming request - clear request start
         self.logger.info("")
@@ -215,6 +208,7 @@ class RichLoggingMiddleware(BaseHTTPMiddleware):
             # Request completion with timing
             self.logger.info(f"[bold blue]<--[/bold blue] [green][{request.method}][/green] [cyan]{request.url.path}[/cyan] [magenta]({duration_ms}ms)[/magenta] [bold][{status_color}][{response.status_code}][/{status_color}][/bold]")
             
+            response.headers["X-Request-ID"] = request_id
             return response
             
         except Exception as e:
@@ -0,0 +1,77 @@
+from services import context_builder
+from services.context_builder import ContextBuilder, Passage, count_tokens, load_tokenizer
+
+FIRST = "Venstre vil redusere bompengene i byene og heller finansiere veiene over statsbudsjettet. " \
+    "Kollektivtrafikken skal bygges ut i alle de store byene."
+# Starts with the last 70 characters of FIRST, like neighbouring chunks split with an overlap
+SECOND = FIRST[-70:] + " Sykkelveier prioriteres foran nye motorveier."
+
+
+def test_stitch_merges_overlapping_chunks_of_one_source():
+    passages = [
+        Passage(text=SECOND, source="program.pdf", rank=0, ids=["b"]),
+        Passage(text=FIRST, source="program.pdf", rank=1, ids=["a"]),
+    ]
+
+    stitched = ContextBuilder().stitch(passages)
+
+    assert len(stitched) == 1
+    assert stitched[0].text == FIRST + SECOND[70:]
+    assert stitched[0].rank == 0
+    assert sorted(stitched[0].ids) == ["a", "b"]
+
+
+def test_stitch_keeps_chunks_of_different_sources_apart():
+    passages = [
+        Passage(text=FIRST, source="program.pdf", rank=0, ids=["a"]),
+        Passage(text=SECOND, source="prinsipper.pdf", rank=1, ids=["b"]),
+    ]
+
+    assert len(ContextBuilder().stitch(passages)) == 2
+
+
+def test_stitch_ignores_short_coincidental_overlaps():
+    passages = [
+        Passage(text="Skolen skal ha flere lærere.", source="program.pdf", rank=0),
+        Passage(text="lærere. Og færre prøver i barneskolen.", source="program.pdf", rank=1),
+    ]
+
+    assert len(ContextBuilder().stitch(passages)) == 2
+
+
+def test_stitch_drops_a_chunk_contained_in_another():
+    passages = [
+        Passage(text=FIRST, source="program.pdf", rank=0, ids=["a"]),
+        Passage(text=FIRST[10:80], source="program.pdf", rank=1, ids=["b"]),
+    ]
+
+    stitched = ContextBuilder().stitch(passages)
+
+    assert [passage.text for passage in stitched] == [FIRST]
+
+
+def test_count_tokens_estimates_until_the_tokenizer_is_loaded(monkeypatch):
+    monkeypatch.setattr(context_builder, "_cached_encoding", None)
+
+    assert count_tokens("a" * 40) == 10
+
+
+def test_load_tokenizer_falls_back_when_the_encoding_cannot_be_loaded(monkeypatch):
+    def unreachable(name):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(context_builder, "_cached_encoding", None)
+    monkeypatch.setattr(context_builder.tiktoken, "get_encoding", unreachable)
+
+    assert load_tokenizer() is False
+    assert count_tokens("a" * 40) == 10
+
+
+def test_pack_keeps_the_best_ranked_passages_within_the_budget(monkeypatch):
+    monkeypatch.setattr(context_builder, "_cached_encoding", None)
+    passages = [Passage(text="x" * 400, source="program.pdf", rank=rank) for rank in range(5)]
+
+    built = ContextBuilder(token_budget=250).pack(passages)
+
+    assert [passage.rank for passage in built.passages] == [0, 1]
+    assert built.dropped == 3
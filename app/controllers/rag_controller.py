@@ -1,23 +1,72 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from services.rag_service import RagService
 from services.vector_store import VectorStore
 from config.openai_config import openapi_client, openapi_embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_ollama import OllamaEmbeddings
 from typing import List
-from config.rich_logging_setup import RichLoggingSetup, RichLoggingMiddleware
+from contextlib import asynccontextmanager
+from config.logging_setup import setup_logging
+from config.metrics import MetricsMiddleware, registry
+import asyncio
+import json
 import logging
+import os
 from prompts.prompt_manager import analysis_prompt
+from tools.cached_embeddings import CachedEmbeddings
+from services.ingestion_service import IngestionService
+from services.ingestion_jobs import IngestionJobRunner, IngestionJobStore
+from model.ingestion_model import FileIngestionResult
+from model.batch_model import BatchItemResult, BatchRequest, BatchResponse
+from services.retrieval_memo import RetrievalMemo
+from services.context_builder import load_tokenizer
+from services.planning_cache import InMemoryPlanningCache, SqlitePlanningCache, TieredPlanningCache
+
+PLANNING_MODES = ("anonymized", "fast", "none")
 
 # Setup
-rich_logging_setup = RichLoggingSetup()
-app = FastAPI()
-app.add_middleware(RichLoggingMiddleware)
-rich_logging_setup.log_startup_banner()
+# LOG_FORMAT=json (default) writes JSON lines from a background thread, LOG_FORMAT=rich is for local development
+logging_setup, RequestLoggingMiddleware = setup_logging()
+logging_setup.log_startup_banner()
 logger = logging.getLogger("ApplicationService")
-vectorstore = VectorStore()
+# VECTOR_BACKEND picks the storage engine: chroma (default), flat or memory
+# SEGMENTATION_MODE picks the spaCy sentence segmentation used to clean uploads, see EmbeddingTool
+segmentation = os.environ.get("SEGMENTATION_MODE", "parser")
+vectorstore = VectorStore(backend=os.environ.get("VECTOR_BACKEND", "chroma"))
 llm = openapi_client()
-embeddings = OllamaEmbeddings(model="mxbai-embed-large")
+# Shared by the vectorstore and every RagService, so repeated queries and re-uploaded chunks skip Ollama
+embeddings = CachedEmbeddings(OllamaEmbeddings(model="mxbai-embed-large"))
+ingestion_service = IngestionService(vectorstore=vectorstore, segmentation=segmentation)
+ingestion_jobs = IngestionJobRunner(store=IngestionJobStore(), ingestion_service=ingestion_service)
+# Planning stage outputs for repeated questions, kept in memory and persisted across restarts
+# PLANNING_CACHE_TTL_SECONDS=0 disables the planning cache
+planning_cache_ttl = float(os.environ.get("PLANNING_CACHE_TTL_SECONDS", 24 * 60 * 60))
+planning_cache = TieredPlanningCache([
+    InMemoryPlanningCache(ttl_seconds=planning_cache_ttl),
+    SqlitePlanningCache(ttl_seconds=planning_cache_ttl)
+])
+# Past this many seconds of planning, answer from the retrieval on the raw question alone
+planning_deadline = float(os.environ["PLANNING_DEADLINE_SECONDS"]) if os.environ.get("PLANNING_DEADLINE_SECONDS") else None
+# Most questions of one /generate-response/batch call answered at once
+batch_concurrency = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the Chroma collections once, every request shares them
+    vectorstore.initialize(llm=llm, embeddings=embeddings)
+    # tiktoken may download the encoding, do it once here instead of in the first request
+    await asyncio.to_thread(load_tokenizer)
+    await ingestion_jobs.start()
+    yield
+    await ingestion_jobs.stop()
+    ingestion_service.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLoggingMiddleware)
 
 
 @app.get("/health")
@@ -25,78 +74,203 @@ def health_check():
     logger.info("Health check endpoint called.")
     return {"status": "healthy", "message": "RAG Service is running"}
 
+# Per-stage and per-request latency histograms in the Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/embedding-cache")
+def embedding_cache_stats():
+    return embeddings.stats()
+
+@app.get("/planning-cache")
+def planning_cache_stats():
+    return planning_cache.stats()
+
+@app.delete("/planning-cache")
+def invalidate_planning_cache(stage: str | None = None):
+    removed = planning_cache.invalidate(stage)
+    return {"status": "success", "stage": stage, "removed": removed}
+
+def build_rag_service(question: str, planning_mode: str, relevance_filter: bool = False) -> RagService:
+    rag_service = RagService() \
+        .with_vectorstore(vectorstore) \
+        .with_planning_cache(planning_cache) \
+        .with_planning_deadline(planning_deadline) \
+        .with_llm(model=llm, embeddings=embeddings, temperature=0)
+
+    # Opt-in per request: drops retrieved passages that are far from every query
+    if relevance_filter:
+        rag_service.with_relevance_filter()
+
+    # "fast" plans and writes the queries in one LLM call, "none" searches with the question itself
+    if planning_mode == "anonymized":
+        rag_service.with_anonymized_planning()
+    elif planning_mode == "fast":
+        rag_service.with_fast_planning()
+
+    return rag_service.with_question(question=question)
+
+
+def validate_planning_mode(planning_mode: str):
+    if planning_mode not in PLANNING_MODES:
+        raise HTTPException(status_code=400, detail=f"planning_mode must be one of {', '.join(PLANNING_MODES)}")
+
+
+def format_sse(event: str, data) -> str:
+    payload = data.model_dump() if hasattr(data, "model_dump") else data
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
 # Endpoint to execute a RAG query
 @app.post("/generate-response")
-def generate_response(question: str):
-    logger.info(f"Generate response endpoint called with question: {question}")
+async def generate_response(question: str, planning_mode: str = "anonymized", relevance_filter: bool = False):
+    logger.info("Generate response endpoint called with question: %s", question)
 
     if not question:
         logger.error("Question cannot be empty.")
         return {"error": "Question cannot be empty"}
 
-    try:
-        response = RagService() \
-            .with_vectorstore(vectorstore) \
-            .with_llm(model=llm, embeddings=embeddings, temperature=0) \
-            .with_anonymized_planning() \
-            .with_question(question=question) \
-            .run(prompt=analysis_prompt)
+    validate_planning_mode(planning_mode)
 
-        return response
+    try:
+        return await build_rag_service(question, planning_mode, relevance_filter).arun(prompt=analysis_prompt)
 
     except Exception as e:
         logger.exception("Error generating response.")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+# Same chain as /generate-response, streamed as server-sent events: plan, queries and
+# retrieved as each stage finishes, token for every chunk of the final answer, then response
+@app.post("/generate-response/stream")
+async def generate_response_stream(question: str, planning_mode: str = "anonymized", relevance_filter: bool = False):
+    logger.info("Streaming response endpoint called with question: %s", question)
+
+    if not question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    validate_planning_mode(planning_mode)
+    rag_service = build_rag_service(question, planning_mode, relevance_filter)
+
+    async def events():
+        async for event, data in rag_service.astream(prompt=analysis_prompt):
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Many questions against the same documents in one call, e.g. every vote of a session.
+# Questions share one retrieval memo, so queries several plans produce are embedded and searched once.
+@app.post("/generate-response/batch", response_model=BatchResponse)
+async def generate_response_batch(request: BatchRequest, stream: bool = False):
+    logger.info("Batch response endpoint called with %s questions", len(request.questions))
+
+    if not all(request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+
+    validate_planning_mode(request.planning_mode)
+    semaphore = asyncio.Semaphore(min(request.concurrency or batch_concurrency, batch_concurrency))
+    memo = RetrievalMemo()
+
+    async def answer(index: int, question: str) -> BatchItemResult:
+        async with semaphore:
+            try:
+                response = await build_rag_service(question, request.planning_mode, request.relevance_filter) \
+                    .with_retrieval_memo(memo) \
+                    .arun(prompt=analysis_prompt)
+                return BatchItemResult(index=index, question=question, status="success", response=response)
+            except Exception as e:
+                # One failed question does not fail the batch
+                logger.exception("Error answering batch question %s.", index)
+                return BatchItemResult(index=index, question=question, status="failed", error=str(e))
+
+    tasks = [asyncio.create_task(answer(index, question)) for index, question in enumerate(request.questions)]
+
+    if not stream:
+        results = await asyncio.gather(*tasks)
+        logger.info("Batch answered, retrieval memo: %s", memo.stats())
+        return BatchResponse(results=results, retrieval=memo.stats())
+
+    async def lines():
+        try:
+            # In completion order, the index says which question each line answers
+            for finished in asyncio.as_completed(tasks):
+                yield (await finished).model_dump_json() + "\n"
+        finally:
+            # The client went away, stop the questions that have not finished
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 # Endpoint to embed documents into the vector store
 @app.post("/embed-documents")
-async def embed_documents(files: List[UploadFile] = File(...)):
-    vectorstore._initialize_vectorstore(llm=llm, embeddings=embeddings)
-
+async def embed_documents(files: List[UploadFile] = File(...), wait: bool = False):
     if not files or len(files) == 0:
         logger.error("No files provided for embedding.")
         raise HTTPException(status_code=400, detail="No files provided.")
 
-    success_count = 0
-    errors = []
+    results = {}
+    uploads = []
 
-    for file in files:
+    for index, file in enumerate(files):
         try:
-            logger.info(f"Processing file: {file.filename}")
+            logger.info("Processing file: %s", file.filename)
 
             if not file.filename:
                 logger.error("Filename is empty.")
-                errors.append({"file": None, "error": "Filename cannot be empty"})
+                results[index] = FileIngestionResult(file=None, status="failed", error="Filename cannot be empty")
                 continue
 
             if not file.filename.lower().endswith('.pdf'):
-                logger.error(f"Invalid file type for {file.filename}")
-                errors.append({"file": file.filename, "error": "Only PDF files are allowed"})
+                logger.error("Invalid file type for %s", file.filename)
+                results[index] = FileIngestionResult(file=file.filename, status="failed", error="Only PDF files are allowed")
                 continue
 
             content = await file.read()
             if len(content) == 0:
-                logger.error(f"File {file.filename} is empty.")
-                errors.append({"file": file.filename, "error": "File is empty"})
+                logger.error("File %s is empty.", file.filename)
+                results[index] = FileIngestionResult(file=file.filename, status="failed", error="File is empty")
                 continue
 
-            await file.seek(0)
-
-            vectorstore.add_document_to_store(
-                embedding_type="both",
-                file=file
-            )
-
-            logger.info(f"Successfully embedded file: {file.filename}")
-            success_count += 1
+            uploads.append((index, file.filename, content))
 
         except Exception as e:
-            logger.error(f"Error embedding file {file.filename}: {str(e)}")
-            errors.append({"file": file.filename, "error": str(e)})
+            logger.error("Error reading file %s: %s", file.filename, str(e))
+            results[index] = FileIngestionResult(file=file.filename, status="failed", error=str(e))
         finally:
             if hasattr(file, 'file') and file.file:
                 file.file.close()
 
+    if not wait:
+        # Parsing and embedding continue in the background, progress is served by /embed-jobs/{job_id}
+        job_id = await ingestion_jobs.submit([(filename, content) for _, filename, content in uploads]) if uploads else None
+        rejected = [results[index] for index in sorted(results)]
+
+        response = {
+            "status": "queued" if job_id else "failed",
+            "job_id": job_id,
+            "message": f"{len(uploads)} out of {len(files)} document(s) queued for embedding",
+            "total_files": len(files),
+            "queued": len(uploads),
+            "errors": [{"file": result.file, "error": result.error} for result in rejected] or None
+        }
+
+        logger.info("Embedding job %s queued with %s file(s)", job_id, len(uploads))
+        return response
+
+    # Files are parsed in parallel in the process pool, embedding follows each file as it finishes
+    ingested = await ingestion_service.ingest_files([(filename, content) for _, filename, content in uploads])
+    for (index, _, _), result in zip(uploads, ingested):
+        results[index] = result
+
+    file_results = [results[index] for index in range(len(files))]
+    success_count = sum(1 for result in file_results if result.status == "success")
+    errors = [{"file": result.file, "error": result.error} for result in file_results if result.status == "failed"]
+
     status = "success" if success_count == len(files) and not errors else "partial_success" if success_count > 0 else "failed"
 
     response = {
@@ -104,8 +278,18 @@ async def embed_documents(files: List[UploadFile] = File(...)):
         "message": f"{success_count} out of {len(files)} document(s) embedded successfully",
         "total_files": len(files),
         "successful": success_count,
-        "errors": errors if errors else None
+        "errors": errors if errors else None,
+        "ingestion": [report.model_dump() for result in file_results for report in result.ingestion],
+        "files": [result.model_dump() for result in file_results]
     }
 
-    logger.info(f"Embedding process completed with status: {status}")
-    return response
\ No newline at end of file
+    logger.info("Embedding process completed with status: %s", status)
+    return response
+
+@app.get("/embed-jobs/{job_id}")
+async def embed_job_status(job_id: str):
+    status = await asyncio.to_thread(ingestion_jobs.store.get_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return status
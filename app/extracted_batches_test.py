@@ -0,0 +1,49 @@
+import queue
+from concurrent.futures import Future
+import pytest
+from services import ingestion_service
+from services.ingestion_service import ExtractedBatches
+from tools.extraction_worker import ExtractionFailed
+
+
+def batches_of(*items, extraction: Future | None = None) -> ExtractedBatches:
+    batch_queue = queue.Queue()
+    for item in items:
+        batch_queue.put(item)
+    return ExtractedBatches(batch_queue, extraction or Future())
+
+
+def test_yields_documents_in_the_order_the_worker_sent_them():
+    batches = batches_of([("chunk", "a"), ("quote", "b")], [("chunk", "c")], None)
+
+    assert [(collection, document.page_content) for collection, document in batches] == [("chunk", "a"), ("quote", "b"), ("chunk", "c")]
+    assert batches.finished
+
+
+def test_a_failed_worker_raises_after_the_documents_it_sent():
+    batches = batches_of([("chunk", "a")], ExtractionFailed("Could not extract a.pdf"))
+    seen = []
+
+    with pytest.raises(ExtractionFailed):
+        for _, document in batches:
+            seen.append(document.page_content)
+
+    assert seen == ["a"]
+
+
+def test_a_worker_that_died_without_the_end_marker_raises(monkeypatch):
+    monkeypatch.setattr(ingestion_service, "BATCH_POLL_SECONDS", 0.01)
+    extraction = Future()
+    extraction.set_exception(RuntimeError("pool broke"))
+
+    with pytest.raises(ExtractionFailed, match="pool broke"):
+        list(batches_of([("chunk", "a")], extraction=extraction))
+
+
+def test_drain_consumes_up_to_the_end_marker():
+    batches = batches_of([("chunk", "a")], [("chunk", "b")], None)
+
+    batches.drain()
+
+    assert batches.finished
+    assert batches.queue.empty()
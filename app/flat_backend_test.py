@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from services.backends.flat_backend import METADATA_FILENAME, VECTORS_FILENAME, FlatBackend
+from services.backends.memory_backend import InMemoryBackend
+
+
+def vectors(count: int, dimensions: int = 8, seed: int = 0) -> list[list[float]]:
+    return np.random.default_rng(seed).normal(size=(count, dimensions)).tolist()
+
+
+def add_rows(backend: FlatBackend, start: int, count: int, seed: int):
+    ids = [f"id-{i}" for i in range(start, start + count)]
+    backend.add(ids=ids, vectors=vectors(count, seed=seed), documents=[f"text {i}" for i in range(start, start + count)], metadatas=[{"n": i} for i in range(start, start + count)])
+
+
+@pytest.fixture(params=["memory", "disk"])
+def backend(request, tmp_path):
+    return InMemoryBackend() if request.param == "memory" else FlatBackend(str(tmp_path))
+
+
+def test_appended_batches_are_all_searchable(backend):
+    for batch in range(20):
+        add_rows(backend, start=batch * 50, count=50, seed=batch)
+
+    query = backend.get(ids=["id-777"], include=["embeddings"])["embeddings"][0]
+    [[(best, score)]] = backend.search_by_vector([query], k=1)
+
+    assert backend.count() == 1000
+    assert best.id == "id-777"
+    assert best.page_content == "text 777"
+    assert best.metadata == {"n": 777}
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_replace_and_delete_after_appends(backend):
+    add_rows(backend, start=0, count=10, seed=1)
+    add_rows(backend, start=10, count=10, seed=2)
+    backend.add(ids=["id-3"], vectors=vectors(1, seed=9), documents=["replaced"], metadatas=[{}])
+    backend.delete(["id-0", "id-15"])
+    add_rows(backend, start=20, count=5, seed=3)
+
+    assert backend.count() == 23
+    assert backend.get(ids=["id-3"])["documents"] == ["replaced"]
+    assert backend.get(ids=["id-0", "id-15"])["ids"] == []
+    assert backend.get(ids=["id-24"])["documents"] == ["text 24"]
+
+
+def test_reopening_reads_every_appended_row(tmp_path):
+    backend = FlatBackend(str(tmp_path))
+    add_rows(backend, start=0, count=30, seed=1)
+    add_rows(backend, start=30, count=30, seed=2)
+    expected = backend.snapshot()
+
+    reopened = FlatBackend(str(tmp_path)).snapshot()
+
+    assert reopened.ids == expected.ids
+    assert reopened.documents == expected.documents
+    assert np.allclose(reopened.vectors, expected.vectors)
+
+
+def test_a_torn_append_is_ignored_and_overwritten(tmp_path):
+    backend = FlatBackend(str(tmp_path))
+    add_rows(backend, start=0, count=5, seed=1)
+    # A write cut off after the vectors and half a metadata line
+    with open(tmp_path / VECTORS_FILENAME, "ab") as f:
+        f.write(np.ones(8, dtype=np.float32).tobytes())
+    with open(tmp_path / METADATA_FILENAME, "ab") as f:
+        f.write(b'{"id": "torn"')
+
+    reopened = FlatBackend(str(tmp_path))
+    assert reopened.count() == 5
+
+    add_rows(reopened, start=5, count=2, seed=2)
+    again = FlatBackend(str(tmp_path))
+    assert again.get()["ids"] == [f"id-{i}" for i in range(7)]
+    assert np.allclose(again.snapshot().vectors, reopened.snapshot().vectors)
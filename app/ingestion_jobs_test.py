@@ -0,0 +1,119 @@
+import asyncio
+from langchain.docstore.document import Document
+from benchmarks.stand_ins import StandInEmbeddings
+from model.ingestion_model import IngestionReport
+from services.ingestion_jobs import IngestionJobRunner, IngestionJobStore
+from services.vector_store import INGESTION_BATCH_SIZE, VectorStore
+from tools.extraction_worker import ExtractedDocument
+
+CHUNKS = [f"Setning nummer {i} om skole og samferdsel." for i in range(INGESTION_BATCH_SIZE * 2 + 10)]
+
+
+class CountingEmbeddings(StandInEmbeddings):
+    def __init__(self):
+        super().__init__(dimensions=16)
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def open_store(embeddings) -> VectorStore:
+    store = VectorStore.in_memory()
+    store.initialize(llm=None, embeddings=embeddings)
+    return store
+
+
+def chunk_stream(texts):
+    return (("chunk", Document(page_content=text)) for text in texts)
+
+
+def test_on_commit_reports_positions_and_resume_skips_the_committed_prefix():
+    embeddings = CountingEmbeddings()
+    store = open_store(embeddings)
+    commits = []
+
+    def fail_after_first_commit(texts):
+        for position, pair in enumerate(chunk_stream(texts), start=1):
+            if position > INGESTION_BATCH_SIZE + 5:
+                raise RuntimeError("worker died")
+            yield pair
+
+    try:
+        store.ingest_documents("program.pdf", "chunk", fail_after_first_commit(CHUNKS), on_commit=commits.append)
+    except RuntimeError:
+        pass
+
+    assert commits == [INGESTION_BATCH_SIZE]
+    assert store.chunk_vectorstore.count() == INGESTION_BATCH_SIZE
+
+    embeddings.embedded = 0
+    [report] = store.ingest_documents("program.pdf", "chunk", chunk_stream(CHUNKS), resume_from=commits[-1], on_commit=commits.append)
+
+    assert embeddings.embedded == len(CHUNKS) - INGESTION_BATCH_SIZE
+    assert (report.new, report.skipped, report.replaced) == (len(CHUNKS) - INGESTION_BATCH_SIZE, 0, 0)
+    assert commits[-1] == len(CHUNKS)
+    assert store.chunk_vectorstore.count() == len(CHUNKS)
+
+
+class StandInIngestionService:
+    """Records how each file is resumed and commits through on_commit like the real service."""
+
+    def __init__(self, commit_to: int = 3, fail: set[str] = frozenset()):
+        self.commit_to = commit_to
+        self.fail = fail
+        self.resumed_from = {}
+
+    async def extract_and_write(self, filename, content, resume_from=0, on_commit=None):
+        self.resumed_from[filename] = resume_from
+        if filename in self.fail:
+            raise ValueError(f"{filename} is not a PDF")
+        await asyncio.to_thread(on_commit, self.commit_to)
+        extracted = ExtractedDocument(filename=filename, pages=2, chunks=self.commit_to, quotes=0)
+        return extracted, [IngestionReport(source=filename, collection="chunk", new=self.commit_to)]
+
+
+def run_jobs(store: IngestionJobStore, service: StandInIngestionService, files=None) -> str | None:
+    async def run():
+        runner = IngestionJobRunner(store=store, ingestion_service=service)
+        await runner.start()
+        job_id = await runner.submit(files) if files else None
+        await runner._queue.join()
+        await runner.stop()
+        return job_id
+
+    return asyncio.run(run())
+
+
+def test_job_reports_progress_and_partial_success(tmp_path):
+    store = IngestionJobStore(directory=str(tmp_path))
+
+    job_id = run_jobs(store, StandInIngestionService(fail={"bad.pdf"}), files=[("good.pdf", b"%PDF"), ("bad.pdf", b"nope")])
+
+    status = store.get_status(job_id)
+    assert status.status == "partial_success"
+    assert [(file.file, file.status, file.pages, file.chunks_embedded) for file in status.files] == [
+        ("good.pdf", "success", 2, 3),
+        ("bad.pdf", "failed", 0, 0),
+    ]
+    assert status.errors == [{"file": "bad.pdf", "error": "bad.pdf is not a PDF"}]
+    # Uploads are only kept until the job finishes
+    assert not (tmp_path / job_id).exists()
+
+
+def test_unfinished_jobs_resume_from_their_last_commit_after_a_restart(tmp_path):
+    store = IngestionJobStore(directory=str(tmp_path))
+    job_id = store.create_job([("program.pdf", b"%PDF")])
+    [job_file] = store.pending_files(job_id)
+    # The process stopped after committing 256 chunks of the file
+    store.mark_job_running(job_id)
+    store.update_file(job_file, status="embedding", chunks_embedded=256)
+
+    service = StandInIngestionService(commit_to=300)
+    run_jobs(IngestionJobStore(directory=str(tmp_path)), service)
+
+    assert service.resumed_from == {"program.pdf": 256}
+    status = store.get_status(job_id)
+    assert status.status == "success"
+    assert status.chunks_embedded == 300
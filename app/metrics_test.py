@@ -0,0 +1,59 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from config.metrics import REQUEST_SECONDS, Histogram, MetricsMiddleware, collect_spans, record_span, server_timing, span
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram("stage_seconds", "Stage duration.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "plan")
+
+    assert histogram.render() == [
+        "# HELP stage_seconds Stage duration.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="plan",le="0.1"} 2',
+        'stage_seconds_bucket{stage="plan",le="1.0"} 3',
+        'stage_seconds_bucket{stage="plan",le="+Inf"} 4',
+        'stage_seconds_sum{stage="plan"} 2.65',
+        'stage_seconds_count{stage="plan"} 4',
+    ]
+
+
+def test_histogram_escapes_label_values():
+    histogram = Histogram("requests", "Requests.", ("path",), buckets=(1.0,))
+    histogram.observe(0.5, 'a"b\\c')
+
+    assert 'requests_count{path="a\\"b\\\\c"} 1' in histogram.render()
+
+
+def test_server_timing_sums_repeated_stages_in_first_seen_order():
+    header = server_timing([("retrieve", 0.010), ("plan", 0.0205), ("retrieve", 0.005)], total=0.05)
+
+    assert header == 'retrieve;dur=15.0;desc="2 calls", plan;dur=20.5, total;dur=50.0'
+
+
+def test_spans_are_only_collected_inside_a_request_or_collect_spans():
+    record_span("outside", 0.1)
+
+    with collect_spans() as spans:
+        with span("inside"):
+            pass
+        record_span("worker", 0.2)
+
+    assert [stage for stage, _ in spans] == ["inside", "worker"]
+    assert spans[1] == ("worker", 0.2)
+
+
+def test_middleware_adds_server_timing_and_times_the_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        record_span("lookup", 0.002)
+        return {"item": item_id}
+
+    response = TestClient(app).get("/items/42")
+
+    assert response.headers["Server-Timing"].startswith("lookup;dur=2.0, total;dur=")
+    assert any('path="/items/{item_id}",status="200"' in line for line in REQUEST_SECONDS.render())
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from model.response_model import RAGResponse
+
+class BatchRequest(BaseModel):
+    questions: list[str] = Field(min_length=1)
+    planning_mode: str = "anonymized"
+    relevance_filter: bool = Field(default=False, description="Drop retrieved passages far from every query")
+    concurrency: int | None = Field(default=None, ge=1, description="Questions answered at once, capped by BATCH_CONCURRENCY")
+
+class BatchItemResult(BaseModel):
+    index: int = Field(description="Position of the question in the request")
+    question: str
+    status: str = Field(description="success or failed")
+    response: RAGResponse | None = None
+    error: str | None = None
+
+class BatchResponse(BaseModel):
+    results: list[BatchItemResult]
+    retrieval: dict = Field(default_factory=dict, description="Distinct queries searched and how often a lookup was shared")
@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class FastPlan(BaseModel):
+    steps: List[str] = Field(
+        description="different steps to follow, should be in sorted order"
+    )
+    queries: list[str] = Field(
+        description="List of Norwegian semantic search queries for the retrieval steps, should be in sorted order"
+    )
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.queries = sorted(self.queries)  # Ensure queries are sorted, like QueriesFromPlan
@@ -0,0 +1,38 @@
+from pydantic import BaseModel, Field
+
+class IngestionReport(BaseModel):
+    source: str
+    collection: str
+    new: int = Field(default=0, description="Chunks embedded and added to the collection")
+    skipped: int = Field(default=0, description="Chunks already in the collection, never sent to the embedder")
+    replaced: int = Field(default=0, description="Chunks from an earlier version of the source that were removed")
+    embedding_seconds: float = Field(default=0.0, description="Time spent embedding and writing new chunks")
+    chunks_per_second: float = Field(default=0.0, description="Embedding throughput for the new chunks")
+
+class FileIngestionResult(BaseModel):
+    file: str | None
+    status: str = Field(description="success or failed")
+    ingestion: list[IngestionReport] = Field(default_factory=list)
+    error: str | None = None
+
+class FileJobProgress(BaseModel):
+    file: str
+    status: str = Field(description="queued, embedding, success or failed")
+    pages: int = Field(default=0, description="Known once the file is extracted")
+    chunks_total: int = Field(default=0, description="Known once the file is extracted")
+    chunks_embedded: int = Field(default=0, description="Chunks and quotes committed to the vector store")
+    ingestion: list[IngestionReport] = Field(default_factory=list)
+    error: str | None = None
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    status: str = Field(description="queued, running, success, partial_success or failed")
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    pages: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_per_second: float = 0.0
+    files: list[FileJobProgress] = Field(default_factory=list)
+    errors: list[dict] = Field(default_factory=list)
@@ -0,0 +1,88 @@
+import pytest
+from services import planning_cache
+from services.planning_cache import InMemoryPlanningCache, SqlitePlanningCache, TieredPlanningCache, planning_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(planning_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(ttl_seconds):
+        if request.param == "memory":
+            return InMemoryPlanningCache(ttl_seconds=ttl_seconds)
+        return SqlitePlanningCache(cache_path=str(tmp_path / f"cache-{ttl_seconds}.sqlite"), ttl_seconds=ttl_seconds)
+    return make
+
+
+def test_entries_expire_after_the_ttl(clock, make_cache):
+    cache = make_cache(60)
+    cache.set("key", "plan", "value")
+
+    clock.now += 59
+    assert cache.get("key") == "value"
+    clock.now += 1
+    assert cache.get("key") is None
+
+
+def test_ttl_zero_disables_the_cache(clock, make_cache):
+    cache = make_cache(0)
+    cache.set("key", "plan", "value")
+
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_none_never_expires(clock, make_cache):
+    cache = make_cache(None)
+    cache.set("key", "plan", "value")
+
+    clock.now += 10 * 365 * 24 * 60 * 60
+    assert cache.get_entry("key") == ("plan", "value", None)
+
+
+def test_invalidate_drops_one_stage_or_everything(clock, make_cache):
+    cache = make_cache(60)
+    cache.set("a", "plan", "1")
+    cache.set("b", "queries", "2")
+
+    assert cache.invalidate("plan") == 1
+    assert (cache.get("a"), cache.get("b")) == (None, "2")
+    assert cache.invalidate() == 1
+
+
+def test_backfill_keeps_the_remaining_ttl_of_the_slower_tier(clock, tmp_path):
+    memory = InMemoryPlanningCache(ttl_seconds=3600)
+    sqlite = SqlitePlanningCache(cache_path=str(tmp_path / "cache.sqlite"), ttl_seconds=100)
+    sqlite.set("key", "plan", "value")
+
+    clock.now += 50
+    tiered = TieredPlanningCache([memory, sqlite])
+    assert tiered.get("key") == "value"
+    assert memory.get_entry("key") == ("plan", "value", 1100.0)
+
+    # Past the SQLite expiry, the backfilled memory entry must be gone too
+    clock.now += 51
+    assert tiered.get("key") is None
+    assert tiered.stats()["hits"] == 1
+
+
+def test_keys_change_with_the_template_model_and_inputs():
+    key = planning_cache_key("plan", "template", "model", {"question": "a"})
+
+    assert key == planning_cache_key("plan", "template", "model", {"question": "a"})
+    assert key != planning_cache_key("plan", "template v2", "model", {"question": "a"})
+    assert key != planning_cache_key("plan", "template", "other model", {"question": "a"})
+    assert key != planning_cache_key("plan", "template", "model", {"question": "b"})
@@ -15,6 +15,7 @@ class PromptManager:
             "planner.md": ["question"], 
             "deanonymize.md": ["plan", "mapping"],
             "queries_from_plan.md": ["question", "plan"],
+            "fast_planner.md": ["question"],
             "analysis.md": ["context", "plan", "original_question", "generated_queries_from_plan"],
             "multi_query_gen.md": ["question"],
             "query_optimization.md": ["query"],
@@ -47,6 +48,10 @@ class PromptManager:
     def queries_from_plan_prompt(self) -> str:
         return self._prompts['queries_from_plan'].template
     
+    @property
+    def fast_planner_prompt(self) -> str:
+        return self._prompts['fast_planner'].template
+    
     @property
     def analysis_prompt(self) -> str:
         return self._prompts['analysis'].template
@@ -70,6 +75,7 @@ anonymizer_prompt = _prompt_manager.anonymizer_prompt
 planner_prompt = _prompt_manager.planner_prompt
 deanonymize_prompt = _prompt_manager.deanonymize_prompt
 queries_from_plan_prompt = _prompt_manager.queries_from_plan_prompt
+fast_planner_prompt = _prompt_manager.fast_planner_prompt
 analysis_prompt = _prompt_manager.analysis_prompt
 multi_query_gen_prompt = _prompt_manager.multi_query_gen_prompt
 query_optimization_prompt = _prompt_manager.query_optimization_prompt
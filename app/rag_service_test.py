@@ -0,0 +1,18 @@
+import pytest
+from benchmarks.stand_ins import StandInChatModel, StandInEmbeddings
+from services.rag_service import RagService
+from services.vector_store import VectorStore
+
+
+def test_with_llm_before_with_vectorstore_raises():
+    with pytest.raises(ValueError, match="with_vectorstore before with_llm"):
+        RagService().with_llm(model=StandInChatModel())
+
+
+def test_with_llm_initializes_a_vectorstore_that_skipped_startup():
+    vectorstore = VectorStore.in_memory()
+
+    service = RagService().with_vectorstore(vectorstore).with_llm(model=StandInChatModel(), embeddings=StandInEmbeddings())
+
+    assert service.llm is not None
+    assert vectorstore.is_initialized
@@ -0,0 +1,53 @@
+import pytest
+from langchain.docstore.document import Document
+from services.rank_fusion import RRF_K, RRF_SCORE_KEY, fused_order, reciprocal_rank_fusion, unique_documents
+
+
+def doc(doc_id: str, text: str | None = None) -> Document:
+    return Document(page_content=text or f"text of {doc_id}", id=doc_id)
+
+
+def ids(documents) -> list[str]:
+    return [document.id for document in documents]
+
+
+def test_rrf_ranks_documents_that_several_queries_agree_on_first():
+    fused = reciprocal_rank_fusion([
+        ("chunk", [doc("a"), doc("b"), doc("c")]),
+        ("chunk", [doc("d"), doc("b"), doc("e")]),
+    ])
+
+    # Ties keep the order the documents were first seen in
+    assert ids(fused["chunk"]) == ["b", "a", "d", "c", "e"]
+    assert fused["chunk"][0].metadata[RRF_SCORE_KEY] == pytest.approx(2 / (RRF_K + 2))
+
+
+def test_rrf_counts_a_document_once_per_list():
+    fused = reciprocal_rank_fusion([("chunk", [doc("a"), doc("a"), doc("b")])])
+
+    assert fused["chunk"][0].metadata[RRF_SCORE_KEY] == pytest.approx(1 / (RRF_K + 1))
+    assert ids(fused["chunk"]) == ["a", "b"]
+
+
+def test_rrf_top_k_is_global_and_fused_order_restores_it():
+    fused = reciprocal_rank_fusion([
+        ("chunk", [doc("a"), doc("b")]),
+        ("quote", [doc("q1"), doc("q2")]),
+        ("chunk", [doc("b"), doc("a")]),
+    ], top_k=3)
+
+    assert ids(fused["chunk"]) == ["a", "b"]
+    assert ids(fused["quote"]) == ["q1"]
+    assert ids(fused_order(fused)) == ["a", "b", "q1"]
+
+
+def test_rrf_does_not_change_the_input_documents():
+    original = doc("a")
+
+    reciprocal_rank_fusion([("chunk", [original])])
+
+    assert RRF_SCORE_KEY not in original.metadata
+
+
+def test_unique_documents_keeps_first_occurrence_in_order():
+    assert ids(unique_documents([doc("b"), doc("a"), doc("b")])) == ["b", "a"]
@@ -0,0 +1,94 @@
+import asyncio
+import numpy as np
+import pytest
+from services.context_builder import Passage
+from tools.relevance_filter import RelevanceFilter, split_sentences
+
+QUERY = [1.0, 0.0, 0.0]
+
+
+def passage(rank: int, text: str | None = None) -> Passage:
+    return Passage(text=text or f"Passasje {rank}.", source="program.pdf", rank=rank, ids=[f"id-{rank}"])
+
+
+def vector_with_similarity(similarity: float) -> list[float]:
+    # Unit vector whose cosine to QUERY is similarity
+    return [similarity, float(np.sqrt(1 - similarity ** 2)), 0.0]
+
+
+class SentenceEmbeddings:
+    """Embeds each known sentence to a fixed vector and records the batches it is asked for."""
+
+    def __init__(self, similarities: dict[str, float]):
+        self.similarities = similarities
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [vector_with_similarity(self.similarities[text]) for text in texts]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+def test_threshold_is_mean_plus_std_but_never_below_min_similarity():
+    relevance_filter = RelevanceFilter(min_similarity=0.35, threshold_std=0.5)
+
+    assert relevance_filter.threshold(np.array([0.6, 0.8])) == pytest.approx(0.75)
+    assert relevance_filter.threshold(np.array([0.1, 0.2])) == pytest.approx(0.35)
+
+
+def test_filter_drops_passages_below_the_threshold_and_keeps_their_order():
+    similarities = [0.9, 0.2, 0.85, 0.1, 0.3]
+    passages = [passage(rank) for rank in range(len(similarities))]
+    vectors_by_id = {f"id-{rank}": vector_with_similarity(similarity) for rank, similarity in enumerate(similarities)}
+
+    kept = RelevanceFilter(min_passages=1).filter([QUERY], passages, vectors_by_id)
+
+    assert [p.rank for p in kept] == [0, 2]
+    assert kept[0].relevance == pytest.approx(0.9, abs=1e-5)
+
+
+def test_filter_keeps_min_passages_even_below_the_threshold():
+    passages = [passage(rank) for rank in range(4)]
+    vectors_by_id = {f"id-{rank}": vector_with_similarity(0.1 * (rank + 1)) for rank in range(4)}
+
+    kept = RelevanceFilter(min_passages=2).filter([QUERY], passages, vectors_by_id)
+
+    assert [p.rank for p in kept] == [2, 3]
+
+
+def test_filter_with_min_passages_zero_can_drop_everything():
+    passages = [passage(rank) for rank in range(3)]
+    vectors_by_id = {f"id-{rank}": vector_with_similarity(0.1) for rank in range(3)}
+
+    assert RelevanceFilter(min_passages=0).filter([QUERY], passages, vectors_by_id) == []
+
+
+def test_prune_sentences_keeps_close_sentences_of_each_passage():
+    text = "Venstre vil fjerne bompenger. Skolen trenger flere lærere. Bompenger rammer distriktene."
+    embeddings = SentenceEmbeddings({
+        "Venstre vil fjerne bompenger.": 0.9,
+        "Skolen trenger flere lærere.": 0.1,
+        "Bompenger rammer distriktene.": 0.8,
+    })
+
+    [pruned] = RelevanceFilter().prune_sentences([QUERY], [passage(0, text)], embeddings)
+
+    assert pruned.text == "Venstre vil fjerne bompenger. Bompenger rammer distriktene."
+    assert pruned.rank == 0
+
+
+def test_prune_sentences_keeps_the_best_sentence_and_skips_single_sentences():
+    far = "Skolen trenger flere lærere. Klima er viktig."
+    single = "Kort passasje."
+    embeddings = SentenceEmbeddings({"Skolen trenger flere lærere.": 0.1, "Klima er viktig.": 0.2})
+
+    pruned = asyncio.run(RelevanceFilter().aprune_sentences([QUERY], [passage(0, far), passage(1, single)], embeddings))
+
+    assert [p.text for p in pruned] == ["Klima er viktig.", single]
+    assert embeddings.calls == [["Skolen trenger flere lærere.", "Klima er viktig."]]
+
+
+def test_split_sentences_splits_at_punctuation_before_a_capital():
+    assert split_sentences("Vi vil ha 2.5 prosent. Neste setning: Ja. siste") == ["Vi vil ha 2.5 prosent.", "Neste setning:", "Ja. siste"]
@@ -0,0 +1,89 @@
+import asyncio
+from langchain.docstore.document import Document
+from services.retrieval_memo import RetrievalMemo
+
+
+def doc(doc_id: str, text: str | None = None) -> Document:
+    return Document(page_content=text or f"text of {doc_id}", id=doc_id)
+
+
+def ids(documents) -> list[str]:
+    return [document.id for document in documents]
+
+
+def searcher(calls: list, delay: float = 0.0):
+    async def search(queries):
+        calls.append(list(queries))
+        await asyncio.sleep(delay)
+        return [[("chunk", [doc(query)])] for query in queries]
+    return search
+
+
+def test_memo_searches_each_query_once():
+    async def run():
+        memo = RetrievalMemo()
+        calls = []
+        first, second = await asyncio.gather(
+            memo.rankings(["a", "b"], 5, ["chunk"], searcher(calls, delay=0.01)),
+            memo.rankings(["b", "c"], 5, ["chunk"], searcher(calls, delay=0.01)),
+        )
+        return memo, calls, first, second
+
+    memo, calls, first, second = asyncio.run(run())
+
+    assert calls == [["a", "b"], ["c"]]
+    assert [ids(rankings[0][1]) for rankings in first + second] == [["a"], ["b"], ["b"], ["c"]]
+    assert memo.stats() == {"queries": 3, "hits": 1, "misses": 3}
+
+
+def test_memo_keys_include_k_and_collections():
+    async def run():
+        memo = RetrievalMemo()
+        calls = []
+        await memo.rankings(["a"], 5, ["chunk"], searcher(calls))
+        await memo.rankings(["a"], 10, ["chunk"], searcher(calls))
+        await memo.rankings(["a"], 5, ["chunk", "quote"], searcher(calls))
+        return calls
+
+    assert asyncio.run(run()) == [["a"], ["a"], ["a"]]
+
+
+def test_memo_cancelling_the_owner_does_not_fail_other_waiters():
+    async def run():
+        memo = RetrievalMemo()
+        calls = []
+        owner = asyncio.create_task(memo.rankings(["a"], 5, ["chunk"], searcher(calls, delay=0.05)))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(memo.rankings(["a"], 5, ["chunk"], searcher(calls)))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return owner, await waiter, calls
+
+    owner, rankings, calls = asyncio.run(run())
+
+    assert owner.cancelled()
+    assert ids(rankings[0][0][1]) == ["a"]
+    assert calls == [["a"]]
+
+
+def test_memo_failures_reach_every_waiter_and_are_retried():
+    async def failing(queries):
+        await asyncio.sleep(0.01)
+        raise ValueError("search failed")
+
+    async def run():
+        memo = RetrievalMemo()
+        failures = await asyncio.gather(
+            memo.rankings(["a"], 5, ["chunk"], failing),
+            memo.rankings(["a"], 5, ["chunk"], failing),
+            return_exceptions=True
+        )
+        calls = []
+        retried = await memo.rankings(["a"], 5, ["chunk"], searcher(calls))
+        return failures, retried, calls
+
+    failures, retried, calls = asyncio.run(run())
+
+    assert [str(failure) for failure in failures] == ["search failed", "search failed"]
+    assert ids(retried[0][0][1]) == ["a"]
+    assert calls == [["a"]]
@@ -0,0 +1,42 @@
+from dataclasses import dataclass, field
+from typing import Protocol, runtime_checkable
+from langchain.docstore.document import Document
+
+
+@dataclass(frozen=True)
+class BackendSnapshot:
+    """Every entry of a backend at one point in time, e.g. to copy a collection into another backend."""
+    ids: list[str] = field(default_factory=list)
+    vectors: list[list[float]] = field(default_factory=list)
+    documents: list[str] = field(default_factory=list)
+    metadatas: list[dict] = field(default_factory=list)
+
+
+@runtime_checkable
+class VectorBackend(Protocol):
+    """Storage engine for one collection of precomputed vectors.
+
+    VectorStore embeds, deduplicates and fuses, the backend only stores and searches.
+    Scores are similarities, higher is better.
+    """
+
+    def add(self, ids: list[str], vectors: list[list[float]], documents: list[str], metadatas: list[dict]):
+        """Insert or replace entries by id."""
+
+    def delete(self, ids: list[str]):
+        pass
+
+    def get(self, ids: list[str] | None = None, where: dict | None = None, include: list[str] | None = None) -> dict:
+        """Entries by id and/or metadata equality, as {"ids": [...], "documents": [...], "metadatas": [...]}.
+
+        include selects "documents", "metadatas" and "embeddings", ids are always returned.
+        """
+
+    def search_by_vector(self, vectors: list[list[float]], k: int = 5) -> list[list[tuple[Document, float]]]:
+        """Top k (Document, score) pairs per query vector, best first."""
+
+    def count(self) -> int:
+        pass
+
+    def snapshot(self) -> BackendSnapshot:
+        pass
@@ -0,0 +1,61 @@
+from langchain.docstore.document import Document
+from langchain_chroma import Chroma
+from services.backends.base import BackendSnapshot
+
+
+class ChromaBackend:
+    """A persistent Chroma collection behind the VectorBackend protocol.
+
+    Vectors arrive precomputed, so the collection is used directly instead of going
+    through the LangChain wrapper's embedding function.
+    """
+
+    def __init__(self, persist_directory: str, collection_metadata: dict | None = None):
+        self.store = Chroma(persist_directory=persist_directory, collection_metadata=collection_metadata)
+        self._collection = self.store._collection
+        self.space = (self._collection.metadata or {}).get("hnsw:space", "l2")
+
+    def add(self, ids: list[str], vectors: list[list[float]], documents: list[str], metadatas: list[dict]):
+        if ids:
+            self._collection.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids: list[str]):
+        if ids:
+            self._collection.delete(ids=ids)
+
+    def get(self, ids: list[str] | None = None, where: dict | None = None, include: list[str] | None = None) -> dict:
+        include = ["documents", "metadatas"] if include is None else include
+        return self._collection.get(ids=ids, where=where, include=include)
+
+    def search_by_vector(self, vectors: list[list[float]], k: int = 5) -> list[list[tuple[Document, float]]]:
+        if not vectors:
+            return []
+
+        # One query call for the whole batch
+        found = self._collection.query(query_embeddings=vectors, n_results=k, include=["documents", "metadatas", "distances"])
+        return [
+            [
+                (Document(page_content=document, metadata=metadata or {}, id=doc_id), self._similarity(distance))
+                for doc_id, document, metadata, distance in zip(ids, documents, metadatas, distances)
+            ]
+            for ids, documents, metadatas, distances in zip(found["ids"], found["documents"], found["metadatas"], found["distances"])
+        ]
+
+    def _similarity(self, distance: float) -> float:
+        if self.space == "l2":
+            # Squared L2 between unit vectors is 2 - 2 * cosine
+            return 1.0 - distance / 2
+        # cosine and ip distances are 1 - similarity
+        return 1.0 - distance
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def snapshot(self) -> BackendSnapshot:
+        stored = self._collection.get(include=["embeddings", "documents", "metadatas"])
+        return BackendSnapshot(
+            ids=list(stored["ids"]),
+            vectors=[list(vector) for vector in stored["embeddings"]],
+            documents=list(stored["documents"]),
+            metadatas=[dict(metadata or {}) for metadata in stored["metadatas"]]
+        )
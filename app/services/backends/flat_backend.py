@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+from langchain.docstore.document import Document
+from services.backends.base import BackendSnapshot
+
+logger = logging.getLogger("ApplicationService")
+
+VECTORS_FILENAME = "vectors.f32"
+# A {"dimensions": ...} header line, then one {"id", "document", "metadata"} line per matrix row
+METADATA_FILENAME = "metadata.jsonl"
+# Rows the in-memory buffer starts with, it doubles whenever it is full
+INITIAL_CAPACITY = 256
+
+
+@dataclass(frozen=True)
+class FlatIndexState:
+    """One consistent view of the index, replaced as a whole on every write."""
+    matrix: np.ndarray
+    ids: list[str]
+    documents: list[str]
+    metadatas: list[dict]
+    positions: dict[str, int]
+
+
+EMPTY_STATE = FlatIndexState(matrix=np.zeros((0, 0), dtype=np.float32), ids=[], documents=[], metadatas=[], positions={})
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def metadata_line(doc_id: str, document: str, metadata: dict) -> bytes:
+    return (json.dumps({"id": doc_id, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class FlatBackend:
+    """Exact vector search over a memory-mapped float32 matrix, for corpora of a few thousand chunks.
+
+    Vectors are stored normalized in vectors.f32, ids, texts and metadata in metadata.jsonl next
+    to it. Opening maps the file instead of loading an HNSW graph, and a search is a single
+    matrix multiply, for one query or a whole batch. Writes build a new state and swap it in,
+    searches keep the state they started with. Without a persist_directory nothing is written.
+
+    Adding new ids appends their rows to both files, so ingesting batch after batch writes each
+    vector once. Replacing or deleting entries rewrites the files.
+    """
+
+    def __init__(self, persist_directory: str | None):
+        self.directory = Path(persist_directory) if persist_directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.Lock()
+        # Bytes of metadata.jsonl up to the last complete row, appends continue from there
+        self._metadata_size = 0
+        # Without a directory, rows live in this buffer and states view its first rows
+        self._buffer: np.ndarray | None = None
+        self._state = self._load()
+
+    def _load(self) -> FlatIndexState:
+        if self.directory is None or not (self.directory / METADATA_FILENAME).exists():
+            return EMPTY_STATE
+
+        dimensions = None
+        ids, documents, metadatas = [], [], []
+        size = 0
+        with open(self.directory / METADATA_FILENAME, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Cut off while appending, its vector row is never mapped
+                    break
+                record = json.loads(line)
+                if dimensions is None:
+                    dimensions = record["dimensions"]
+                else:
+                    ids.append(record["id"])
+                    documents.append(record["document"])
+                    metadatas.append(record["metadata"])
+                size += len(line)
+
+        if dimensions is None:
+            return EMPTY_STATE
+
+        self._metadata_size = size
+        return self._state_of(self._map(len(ids), dimensions), ids, documents, metadatas)
+
+    def _map(self, rows: int, dimensions: int) -> np.ndarray:
+        # The vector file may hold rows past the last complete metadata line, those are not mapped
+        if rows == 0:
+            return np.zeros((0, dimensions), dtype=np.float32)
+        return np.memmap(self.directory / VECTORS_FILENAME, dtype=np.float32, mode="r", shape=(rows, dimensions))
+
+    def _state_of(self, matrix: np.ndarray, ids: list[str], documents: list[str], metadatas: list[dict]) -> FlatIndexState:
+        return FlatIndexState(
+            matrix=matrix,
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            positions={doc_id: position for position, doc_id in enumerate(ids)}
+        )
+
+    def _replace_state(self, matrix: np.ndarray, ids: list[str], documents: list[str], metadatas: list[dict]):
+        self._buffer = None
+        if self.directory is None:
+            self._state = self._state_of(matrix, ids, documents, metadatas)
+            return
+
+        # Write both files next to the live ones and swap them in, then map the new matrix
+        vectors_tmp = self.directory / f"{VECTORS_FILENAME}.tmp"
+        metadata_tmp = self.directory / f"{METADATA_FILENAME}.tmp"
+        np.ascontiguousarray(matrix, dtype=np.float32).tofile(vectors_tmp)
+        with open(metadata_tmp, "wb") as f:
+            f.write((json.dumps({"dimensions": int(matrix.shape[1])}) + "\n").encode("utf-8"))
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                f.write(metadata_line(doc_id, document, metadata))
+
+        os.replace(vectors_tmp, self.directory / VECTORS_FILENAME)
+        os.replace(metadata_tmp, self.directory / METADATA_FILENAME)
+        self._state = self._load()
+
+    def _append_state(self, state: FlatIndexState, ids: list[str], vectors: np.ndarray, documents: list[str], metadatas: list[dict]):
+        """Add rows for new ids without touching the existing ones, in time and I/O linear in the new rows."""
+        rows, dimensions = len(state.ids), vectors.shape[1]
+        if self.directory is None:
+            matrix = self._append_to_buffer(state, vectors)
+        else:
+            if rows == 0:
+                # Start both files over, whatever a failed first write left behind is dropped
+                with open(self.directory / METADATA_FILENAME, "wb") as f:
+                    f.write((json.dumps({"dimensions": int(dimensions)}) + "\n").encode("utf-8"))
+                    self._metadata_size = f.tell()
+
+            # Vectors first, so every complete metadata line always has its row on disk
+            vectors_path = self.directory / VECTORS_FILENAME
+            with open(vectors_path, "r+b" if vectors_path.exists() else "wb") as f:
+                f.seek(rows * dimensions * 4)
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+                f.truncate()
+            with open(self.directory / METADATA_FILENAME, "r+b") as f:
+                f.seek(self._metadata_size)
+                for doc_id, document, metadata in zip(ids, documents, metadatas):
+                    f.write(metadata_line(doc_id, document, metadata))
+                f.truncate()
+                self._metadata_size = f.tell()
+            matrix = self._map(rows + len(ids), dimensions)
+
+        positions = dict(state.positions)
+        for offset, doc_id in enumerate(ids):
+            positions[doc_id] = rows + offset
+        self._state = FlatIndexState(
+            matrix=matrix,
+            ids=state.ids + ids,
+            documents=state.documents + documents,
+            metadatas=state.metadatas + metadatas,
+            positions=positions
+        )
+
+    def _append_to_buffer(self, state: FlatIndexState, vectors: np.ndarray) -> np.ndarray:
+        rows, needed = len(state.ids), len(state.ids) + len(vectors)
+        buffer = self._buffer
+        if buffer is None or needed > buffer.shape[0] or buffer.shape[1] != vectors.shape[1]:
+            # Doubling keeps appends amortized constant per row, older states keep viewing the old buffer
+            buffer = np.empty((max(INITIAL_CAPACITY, 2 * needed), vectors.shape[1]), dtype=np.float32)
+            if rows:
+                buffer[:rows] = state.matrix
+            self._buffer = buffer
+        # Rows past the end of every existing state's view, so no running search sees them change
+        buffer[rows:needed] = vectors
+        return buffer[:needed]
+
+    def count(self) -> int:
+        return len(self._state.ids)
+
+    def add(self, ids: list[str], vectors: list[list[float]], documents: list[str], metadatas: list[dict]):
+        if not ids:
+            return
+
+        normalized = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        with self._write_lock:
+            state = self._state
+            if len(set(ids)) == len(ids) and not any(doc_id in state.positions for doc_id in ids):
+                self._append_state(state, list(ids), normalized, list(documents), [metadata or {} for metadata in metadatas])
+                return
+
+            # Replacing entries changes rows that searches may be reading, write a new state instead
+            matrix = np.array(state.matrix, dtype=np.float32) if state.ids else np.zeros((0, normalized.shape[1]), dtype=np.float32)
+            all_ids, all_documents, all_metadatas = list(state.ids), list(state.documents), list(state.metadatas)
+            positions = dict(state.positions)
+
+            appended = []
+            for row, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                if doc_id in positions:
+                    matrix[positions[doc_id]] = normalized[row]
+                    all_documents[positions[doc_id]] = document
+                    all_metadatas[positions[doc_id]] = metadata or {}
+                else:
+                    positions[doc_id] = len(all_ids)
+                    all_ids.append(doc_id)
+                    all_documents.append(document)
+                    all_metadatas.append(metadata or {})
+                    appended.append(row)
+
+            if appended:
+                matrix = np.vstack([matrix, normalized[appended]])
+            self._replace_state(matrix, all_ids, all_documents, all_metadatas)
+
+    def get(self, ids: list[str] | None = None, where: dict | None = None, include: list[str] | None = None) -> dict:
+        state = self._state
+        if ids is not None:
+            positions = [state.positions[doc_id] for doc_id in ids if doc_id in state.positions]
+        else:
+            positions = range(len(state.ids))
+
+        if where:
+            positions = [
+                position for position in positions
+                if all(state.metadatas[position].get(key) == value for key, value in where.items())
+            ]
+
+        include = ["documents", "metadatas"] if include is None else include
+        result = {"ids": [state.ids[position] for position in positions]}
+        if "documents" in include:
+            result["documents"] = [state.documents[position] for position in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [state.metadatas[position] for position in positions]
+        if "embeddings" in include:
+            result["embeddings"] = [state.matrix[position].tolist() for position in positions]
+        return result
+
+    def delete(self, ids: list[str]):
+        if not ids:
+            return
+
+        with self._write_lock:
+            state = self._state
+            removed = set(ids)
+            kept = [position for position, doc_id in enumerate(state.ids) if doc_id not in removed]
+            if len(kept) == len(state.ids):
+                return
+
+            self._replace_state(
+                np.asarray(state.matrix)[kept],
+                [state.ids[position] for position in kept],
+                [state.documents[position] for position in kept],
+                [state.metadatas[position] for position in kept]
+            )
+
+    def search_by_vector(self, vectors: list[list[float]], k: int = 5) -> list[list[tuple[Document, float]]]:
+        """Exact top k cosine matches for every query vector with one matrix multiply."""
+        state = self._state
+        if not state.ids or not vectors:
+            return [[] for _ in vectors]
+
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        scores = queries @ state.matrix.T
+        k = min(k, len(state.ids))
+
+        # argpartition finds the top k in linear time, only those k are sorted
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([
+                (
+                    Document(page_content=state.documents[position], metadata=dict(state.metadatas[position]), id=state.ids[position]),
+                    float(scores[row, position])
+                )
+                for position in ordered
+            ])
+        return results
+
+    def snapshot(self) -> BackendSnapshot:
+        state = self._state
+        return BackendSnapshot(
+            ids=list(state.ids),
+            vectors=np.asarray(state.matrix).tolist(),
+            documents=list(state.documents),
+            metadatas=[dict(metadata) for metadata in state.metadatas]
+        )
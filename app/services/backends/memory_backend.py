@@ -0,0 +1,15 @@
+from services.backends.base import BackendSnapshot
+from services.backends.flat_backend import FlatBackend
+
+
+class InMemoryBackend(FlatBackend):
+    """Flat exact search without any files, for tests and benchmarks that should not touch disk."""
+
+    def __init__(self):
+        super().__init__(persist_directory=None)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: BackendSnapshot) -> "InMemoryBackend":
+        backend = cls()
+        backend.add(snapshot.ids, snapshot.vectors, snapshot.documents, snapshot.metadatas)
+        return backend
@@ -0,0 +1,129 @@
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from langchain.docstore.document import Document
+
+logger = logging.getLogger("ApplicationService")
+
+LEXICAL_INDEX_DIRECTORY = "./chroma/bm25"
+TOKEN_PATTERN = re.compile(r"\w+")
+# Frequent Norwegian function words, they carry no signal for policy terms and bloat the postings
+STOPWORDS = frozenset("""
+    og i på er det som en et til av for med at å har de den ikke om vi seg så men
+    fra skal kan vil ved være var blir ble eller også dette disse sin sitt sine mer
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring for one collection.
+
+    Exact policy terms like "bompenger" or "formuesskatt" can rank low in embedding space,
+    this catches them without a network round-trip. Only the documents are persisted, the
+    postings are rebuilt on load, which takes milliseconds for a few thousand chunks.
+    """
+
+    def __init__(self, path: str | None = None, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self._documents: dict[str, tuple[str, dict]] = {}
+        self._term_frequencies: dict[str, Counter] = {}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._lengths: dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        index = cls(path=path)
+        if index.path.exists():
+            with open(index.path, encoding="utf-8") as f:
+                stored = json.load(f)
+            index.add(
+                ids=[document["id"] for document in stored],
+                texts=[document["text"] for document in stored],
+                metadatas=[document["metadata"] for document in stored]
+            )
+        return index
+
+    def save(self):
+        if self.path is None:
+            return
+
+        with self._lock:
+            stored = [{"id": doc_id, "text": text, "metadata": metadata} for doc_id, (text, metadata) in self._documents.items()]
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f, ensure_ascii=False)
+        # Readers never see a half-written index
+        os.replace(temporary_path, self.path)
+
+    def count(self) -> int:
+        return len(self._documents)
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict]):
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._documents:
+                    self._remove_one(doc_id)
+
+                term_frequencies = Counter(tokenize(text))
+                self._documents[doc_id] = (text, dict(metadata or {}))
+                self._term_frequencies[doc_id] = term_frequencies
+                self._lengths[doc_id] = sum(term_frequencies.values())
+                self._total_length += self._lengths[doc_id]
+                for term, frequency in term_frequencies.items():
+                    self._postings.setdefault(term, {})[doc_id] = frequency
+
+    def delete(self, ids: list[str]):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._documents:
+                    self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str):
+        del self._documents[doc_id]
+        term_frequencies = self._term_frequencies.pop(doc_id)
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in term_frequencies:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, k: int = 5) -> list[tuple[Document, float]]:
+        """Top k documents for the query by BM25 score, best first. Documents without a query term are never returned."""
+        with self._lock:
+            document_count = len(self._documents)
+            if document_count == 0:
+                return []
+
+            average_length = self._total_length / document_count
+            scores: dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                (Document(page_content=self._documents[doc_id][0], metadata=dict(self._documents[doc_id][1]), id=doc_id), score)
+                for doc_id, score in best
+            ]
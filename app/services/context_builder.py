@@ -0,0 +1,156 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from langchain.docstore.document import Document
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger("ApplicationService")
+
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 3000))
+# Neighbouring chunks share up to chunk_overlap (200) characters, shorter matches are coincidental
+MIN_STITCH_OVERLAP = 40
+MAX_STITCH_OVERLAP = 400
+TOKENIZER_ENCODING = "cl100k_base"
+
+
+def count_tokens(text: str) -> int:
+    """Token count with the tiktoken encoding once load_tokenizer has loaded it, otherwise the usual four characters per token estimate."""
+    if _cached_encoding is not None:
+        return len(_cached_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+_cached_encoding = None
+
+
+def load_tokenizer() -> bool:
+    """Load the tiktoken encoding once, at startup. Returns whether exact counts are available.
+
+    tiktoken downloads the encoding on first use, so this is kept off the request path. Without
+    tiktoken or network access the estimate is used instead of failing requests.
+    """
+    global _cached_encoding
+    if _cached_encoding is not None:
+        return True
+    if tiktoken is None:
+        return False
+
+    try:
+        _cached_encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning("Could not load the %s tokenizer, estimating tokens from characters: %s", TOKENIZER_ENCODING, e)
+        return False
+    return True
+
+
+@dataclass
+class Passage:
+    text: str
+    source: str | None
+    rank: int
+    # Ids of the stored chunks the passage was stitched from
+    ids: list[str] = field(default_factory=list)
+    relevance: float | None = None
+
+
+@dataclass
+class BuiltContext:
+    text: str
+    tokens: int
+    passages: list[Passage] = field(default_factory=list)
+    dropped: int = 0
+
+
+class ContextBuilder:
+    """Turns ranked retrieval results into compact numbered passages that fit a token budget.
+
+    Chunks are split with an overlap, so neighbouring chunks of one source repeat text. Those are
+    stitched into one passage first. Passages are then packed best-ranked first until the budget
+    is spent, and formatted without the Document repr and metadata noise.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+
+    def build(self, documents: list[Document]) -> BuiltContext:
+        return self.pack(self.passages(documents))
+
+    def passages(self, documents: list[Document]) -> list[Passage]:
+        """Stitched passages of documents given best first, ranked by that order."""
+        return self.stitch([
+            Passage(
+                text=document.page_content.strip(),
+                source=document.metadata.get("source"),
+                rank=rank,
+                ids=[document.id] if getattr(document, "id", None) else []
+            )
+            for rank, document in enumerate(documents)
+            if document.page_content.strip()
+        ])
+
+    def pack(self, passages: list[Passage]) -> BuiltContext:
+        """Best-ranked passages first until the token budget is spent."""
+        packed, used_tokens = [], 0
+        for passage in sorted(passages, key=lambda passage: passage.rank):
+            tokens = count_tokens(self.format_passage(len(packed) + 1, passage)) + 1
+            if used_tokens + tokens > self.token_budget:
+                continue
+            packed.append(passage)
+            used_tokens += tokens
+
+        text = "\n".join(self.format_passage(number, passage) for number, passage in enumerate(packed, start=1))
+        built = BuiltContext(text=text, tokens=count_tokens(text), passages=packed, dropped=len(passages) - len(packed))
+        logger.info(
+            "[dim]Context built from %s passages:[/dim] %s packed, %s tokens, %s dropped over the %s token budget",
+            len(passages), len(packed), built.tokens, built.dropped, self.token_budget
+        )
+        return built
+
+    def stitch(self, passages: list[Passage]) -> list[Passage]:
+        """Merge passages of the same source whose end overlaps the start of another."""
+        merged = True
+        while merged:
+            merged = False
+            for first in passages:
+                for second in passages:
+                    if first is second or first.source != second.source:
+                        continue
+                    overlap = self.find_overlap(first.text, second.text)
+                    if overlap:
+                        first.text = first.text + second.text[overlap:]
+                        first.rank = min(first.rank, second.rank)
+                        first.ids = first.ids + second.ids
+                        passages.remove(second)
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        return passages
+
+    def find_overlap(self, first: str, second: str) -> int:
+        """Length of the longest suffix of first that is a prefix of second, 0 below MIN_STITCH_OVERLAP."""
+        if second in first:
+            return len(second)
+
+        head = second[:MIN_STITCH_OVERLAP]
+        if len(head) < MIN_STITCH_OVERLAP:
+            return 0
+
+        window_start = max(0, len(first) - MAX_STITCH_OVERLAP)
+        position = first.find(head, window_start)
+        while position != -1:
+            overlap = len(first) - position
+            if second.startswith(first[position:]):
+                return overlap
+            position = first.find(head, position + 1)
+
+        return 0
+
+    def format_passage(self, number: int, passage: Passage) -> str:
+        source = f" ({passage.source})" if passage.source else ""
+        return f"[{number}]{source} {passage.text}"
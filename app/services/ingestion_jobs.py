@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from model.ingestion_model import FileJobProgress, IngestionJobStatus, IngestionReport
+from services.ingestion_service import IngestionService
+
+logger = logging.getLogger("ApplicationService")
+
+JOBS_DIRECTORY = "./jobs"
+
+UNFINISHED_JOB_STATUSES = ("queued", "running")
+FINISHED_FILE_STATUSES = ("success", "failed")
+
+
+@dataclass
+class JobFile:
+    job_id: str
+    position: int
+    filename: str
+    path: str
+    chunks_embedded: int
+
+
+class IngestionJobStore:
+    """SQLite-backed job records. Uploaded files are kept on disk until their job finishes."""
+
+    def __init__(self, directory: str = JOBS_DIRECTORY):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.directory / "ingestion_jobs.sqlite", check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages INTEGER NOT NULL DEFAULT 0,
+                chunks_total INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                reports TEXT,
+                error TEXT,
+                PRIMARY KEY (job_id, position)
+            );
+        """)
+        self._connection.commit()
+
+    def create_job(self, files: list[tuple[str, bytes]]) -> str:
+        job_id = uuid.uuid4().hex
+        job_directory = self.directory / job_id
+        job_directory.mkdir(parents=True)
+
+        rows = []
+        for position, (filename, content) in enumerate(files):
+            path = job_directory / f"{position}.pdf"
+            path.write_bytes(content)
+            rows.append((job_id, position, filename, str(path), "queued"))
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (id, status, created_at) VALUES (?, 'queued', ?)",
+                (job_id, time.time())
+            )
+            self._connection.executemany(
+                "INSERT INTO job_files (job_id, position, filename, path, status) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._connection.commit()
+
+        return job_id
+
+    def unfinished_job_ids(self) -> list[str]:
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id FROM jobs WHERE status IN ({','.join('?' * len(UNFINISHED_JOB_STATUSES))}) ORDER BY created_at",
+                UNFINISHED_JOB_STATUSES
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def pending_files(self, job_id: str) -> list[JobFile]:
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT job_id, position, filename, path, chunks_embedded FROM job_files "
+                f"WHERE job_id = ? AND status NOT IN ({','.join('?' * len(FINISHED_FILE_STATUSES))}) ORDER BY position",
+                (job_id, *FINISHED_FILE_STATUSES)
+            ).fetchall()
+        return [JobFile(*row) for row in rows]
+
+    def mark_job_running(self, job_id: str):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (time.time(), job_id)
+            )
+            self._connection.commit()
+
+    def update_file(self, job_file: JobFile, **fields):
+        if "reports" in fields:
+            fields["reports"] = json.dumps([report.model_dump() for report in fields["reports"]])
+
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connection.execute(
+                f"UPDATE job_files SET {assignments} WHERE job_id = ? AND position = ?",
+                (*fields.values(), job_file.job_id, job_file.position)
+            )
+            self._connection.commit()
+
+    def finish_job(self, job_id: str):
+        status = self.get_status(job_id)
+        succeeded = sum(1 for file in status.files if file.status == "success")
+        final_status = "success" if succeeded == len(status.files) else "partial_success" if succeeded else "failed"
+
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+                (final_status, time.time(), job_id)
+            )
+            self._connection.commit()
+
+        # The uploads are only needed to resume, drop them once the job is done
+        shutil.rmtree(self.directory / job_id, ignore_errors=True)
+
+    def get_status(self, job_id: str) -> IngestionJobStatus | None:
+        with self._lock:
+            job = self._connection.execute(
+                "SELECT id, status, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            file_rows = self._connection.execute(
+                "SELECT filename, status, pages, chunks_total, chunks_embedded, reports, error "
+                "FROM job_files WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+
+        files = [
+            FileJobProgress(
+                file=filename,
+                status=file_status,
+                pages=pages,
+                chunks_total=chunks_total,
+                chunks_embedded=chunks_embedded,
+                ingestion=[IngestionReport(**report) for report in json.loads(reports)] if reports else [],
+                error=error
+            )
+            for filename, file_status, pages, chunks_total, chunks_embedded, reports, error in file_rows
+        ]
+
+        _, status, created_at, started_at, finished_at = job
+        chunks_embedded = sum(file.chunks_embedded for file in files)
+        elapsed = ((finished_at or time.time()) - started_at) if started_at else 0.0
+
+        return IngestionJobStatus(
+            job_id=job_id,
+            status=status,
+            created_at=created_at,
+            started_at=started_at,
+            finished_at=finished_at,
+            pages=sum(file.pages for file in files),
+            chunks_total=sum(file.chunks_total for file in files),
+            chunks_embedded=chunks_embedded,
+            chunks_per_second=chunks_embedded / elapsed if elapsed > 0 else 0.0,
+            files=files,
+            errors=[{"file": file.file, "error": file.error} for file in files if file.error]
+        )
+
+
+class IngestionJobRunner:
+    """Runs queued ingestion jobs in the background, one job at a time.
+
+    Jobs that were queued or running when the process stopped are picked up again on start.
+    Each file resumes after the last batch it committed to the vector store.
+    """
+
+    def __init__(self, store: IngestionJobStore, ingestion_service: IngestionService):
+        self.store = store
+        self.ingestion_service = ingestion_service
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+
+    async def start(self):
+        for job_id in await asyncio.to_thread(self.store.unfinished_job_ids):
+            logger.info("Resuming ingestion job %s", job_id)
+            self._queue.put_nowait(job_id)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, files: list[tuple[str, bytes]]) -> str:
+        # Writing the uploads and the job rows blocks, keep it off the event loop
+        job_id = await asyncio.to_thread(self.store.create_job, files)
+        self._queue.put_nowait(job_id)
+        logger.info("Queued ingestion job %s with %s file(s)", job_id, len(files))
+        return job_id
+
+    async def _run(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                logger.error("Error running ingestion job %s: %s", job_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        await asyncio.to_thread(self.store.mark_job_running, job_id)
+        pending_files = await asyncio.to_thread(self.store.pending_files, job_id)
+        # Files of a job are extracted in parallel in the ingestion pool
+        await asyncio.gather(*(self._run_file(job_file) for job_file in pending_files))
+        await asyncio.to_thread(self.store.finish_job, job_id)
+        logger.info("Ingestion job %s finished", job_id)
+
+    async def _run_file(self, job_file: JobFile):
+        try:
+            # Extraction and embedding overlap, chunks are embedded while later pages are parsed
+            await asyncio.to_thread(self.store.update_file, job_file, status="embedding")
+            content = await asyncio.to_thread(Path(job_file.path).read_bytes)
+            extracted, reports = await self.ingestion_service.extract_and_write(
+                job_file.filename,
+                content,
+                resume_from=job_file.chunks_embedded,
+                # Called from the ingestion thread, not on the event loop
+                on_commit=lambda position: self.store.update_file(job_file, chunks_embedded=position)
+            )
+
+            await asyncio.to_thread(
+                self.store.update_file,
+                job_file,
+                status="success",
+                pages=extracted.pages,
+                chunks_total=extracted.chunks + extracted.quotes,
+                reports=reports
+            )
+        except Exception as e:
+            logger.error("Error embedding file %s: %s", job_file.filename, str(e))
+            await asyncio.to_thread(self.store.update_file, job_file, status="failed", error=str(e))
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from langchain.docstore.document import Document
+from typing import Callable, Iterator
+from config.metrics import record_span
+from model.ingestion_model import FileIngestionResult, IngestionReport
+from services.vector_store import VectorStore, QUOTE_PATTERN
+from tools.embedding_tool import SEGMENTATION_MODES
+from tools.extraction_worker import ExtractedDocument, ExtractionFailed, extract_document, initialize_worker
+
+logger = logging.getLogger("ApplicationService")
+
+# Batches a worker may run ahead of the embedder before it waits, bounds the parsed text held per file
+EXTRACTION_QUEUE_BATCHES = 32
+BATCH_POLL_SECONDS = 1.0
+
+
+class ExtractedBatches:
+    """Iterates the (collection, Document) pairs a pool worker streams through a manager queue.
+
+    extraction is the worker's future. If the worker dies without sending the end marker,
+    e.g. when the pool breaks, the iterator raises instead of waiting forever.
+    """
+
+    def __init__(self, queue, extraction: Future):
+        self.queue = queue
+        self.extraction = extraction
+        self.finished = False
+
+    def __iter__(self) -> Iterator[tuple[str, Document]]:
+        while not self.finished:
+            batch = self._next_batch()
+            if batch is None:
+                self.finished = True
+                return
+            if isinstance(batch, ExtractionFailed):
+                self.finished = True
+                # Raised before the store removes stale chunks, a half-read file must not replace the old one
+                raise batch
+            for collection, text in batch:
+                yield collection, Document(page_content=text)
+
+    def drain(self):
+        """Consume what is left, so a worker waiting on the full queue can finish."""
+        while not self.finished:
+            batch = self._next_batch()
+            self.finished = batch is None or isinstance(batch, ExtractionFailed)
+
+    def _next_batch(self):
+        while True:
+            try:
+                return self.queue.get(timeout=BATCH_POLL_SECONDS)
+            except queue.Empty:
+                if self.extraction.done() and self.queue.empty():
+                    error = self.extraction.exception()
+                    return ExtractionFailed(f"Extraction stopped without finishing: {error}")
+
+
+class IngestionService:
+    """Parses uploads in a process pool and pipelines embedding and Chroma writes behind it.
+
+    pdfplumber and spaCy are CPU-bound, running them in worker processes keeps the event
+    loop free and uses every core. Workers stream chunk batches back through a manager
+    queue, and a thread embeds and writes them while the rest of the file is still parsed.
+    """
+
+    def __init__(self, vectorstore: VectorStore, max_workers: int | None = None, segmentation: str = "parser"):
+        self.vectorstore = vectorstore
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if segmentation not in SEGMENTATION_MODES:
+            raise ValueError(f"Unknown segmentation mode: {segmentation}, expected one of {SEGMENTATION_MODES}")
+        self.segmentation = segmentation
+        self._pool: ProcessPoolExecutor | None = None
+        self._manager: SyncManager | None = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Forking a process that already runs Chroma and HTTP client threads can deadlock
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initialize_worker,
+                initargs=(self.segmentation,)
+            )
+            logger.info("[bold green]Ingestion pool started with %s workers.[/bold green]", self.max_workers)
+        return self._pool
+
+    @property
+    def manager(self) -> SyncManager:
+        if self._manager is None:
+            # Its queues can be passed to pool workers, plain multiprocessing queues cannot
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    async def ingest_files(self, files: list[tuple[str, bytes]], embedding_type: str = "both") -> list[FileIngestionResult]:
+        """Ingest (filename, content) pairs, returning one result per file in the given order."""
+        return await asyncio.gather(*(
+            self.ingest_file(filename, content, embedding_type) for filename, content in files
+        ))
+
+    async def ingest_file(self, filename: str, content: bytes, embedding_type: str = "both") -> FileIngestionResult:
+        try:
+            _, reports = await self.extract_and_write(filename, content, embedding_type=embedding_type)
+
+            logger.info("Successfully embedded file: %s", filename)
+            return FileIngestionResult(file=filename, status="success", ingestion=reports)
+        except Exception as e:
+            logger.error("Error embedding file %s: %s", filename, str(e))
+            return FileIngestionResult(file=filename, status="failed", error=str(e))
+
+    async def extract_and_write(
+        self,
+        filename: str,
+        content: bytes,
+        embedding_type: str = "both",
+        resume_from: int = 0,
+        on_commit: Callable[[int], None] | None = None
+    ) -> tuple[ExtractedDocument, list[IngestionReport]]:
+        """Extract one file in the pool while a thread embeds and stores its chunks as they arrive."""
+        logger.info("Extracting %s in the ingestion pool.", filename)
+        batch_queue = self.manager.Queue(maxsize=EXTRACTION_QUEUE_BATCHES)
+        extraction = self.pool.submit(extract_document, filename, content, QUOTE_PATTERN, batch_queue)
+        batches = ExtractedBatches(batch_queue, extraction)
+        try:
+            reports = await asyncio.to_thread(
+                self.vectorstore.ingest_documents,
+                source=filename,
+                embedding_type=embedding_type,
+                documents=iter(batches),
+                resume_from=resume_from,
+                on_commit=on_commit
+            )
+        except Exception:
+            await asyncio.to_thread(batches.drain)
+            # A worker error explains the failure better than the ExtractionFailed marker
+            await self._finish_extraction(extraction)
+            raise
+
+        return await self._finish_extraction(extraction), reports
+
+    async def _finish_extraction(self, extraction: Future) -> ExtractedDocument:
+        extracted = await asyncio.wrap_future(extraction)
+        # The worker's own registry is never served, its spans count once they are back here
+        for stage, seconds in extracted.timings:
+            record_span(stage, seconds)
+        return extracted
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger("ApplicationService")
+
+DEFAULT_CACHE_PATH = "./chroma/planning_cache.sqlite"
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+def planning_cache_key(stage: str, template: str, model_name: str, inputs: dict) -> str:
+    """Key a stage output by stage, prompt template, model and inputs, so a prompt edit invalidates it."""
+    template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()
+    serialized_inputs = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{stage}\0{template_hash}\0{model_name}\0{serialized_inputs}".encode("utf-8")).hexdigest()
+
+
+class PlanningCache(ABC):
+    """Stores serialized planning-stage outputs for a limited time.
+
+    ttl_seconds=None keeps entries until they are invalidated, 0 expires them at once, which disables the cache.
+    """
+
+    def __init__(self, ttl_seconds: float | None = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    def _expires_at(self, expires_at: float | None = None) -> float | None:
+        """This tier's expiry for a new entry, never later than expires_at when the entry comes from another tier."""
+        own = time.time() + self.ttl_seconds if self.ttl_seconds is not None else None
+        if expires_at is None or own is None:
+            return own if expires_at is None else expires_at
+        return min(own, expires_at)
+
+    def get(self, key: str) -> str | None:
+        entry = self.get_entry(key)
+        return entry[1] if entry else None
+
+    @abstractmethod
+    def get_entry(self, key: str) -> tuple[str, str, float | None] | None:
+        """Return the (stage, value, expires_at) stored under key, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, stage: str, value: str, expires_at: float | None = None):
+        """Store value, expiring after the TTL or at expires_at, whichever comes first."""
+
+    @abstractmethod
+    def invalidate(self, stage: str | None = None) -> int:
+        """Drop every entry, or only those of one stage. Returns the number of entries removed."""
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+class InMemoryPlanningCache(PlanningCache):
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float | None = DEFAULT_TTL_SECONDS):
+        super().__init__(ttl_seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[str, float | None, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key: str) -> tuple[str, str, float | None] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[2], entry[1]
+
+    def set(self, key: str, stage: str, value: str, expires_at: float | None = None):
+        with self._lock:
+            self._entries[key] = (stage, self._expires_at(expires_at), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, stage: str | None = None) -> int:
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if stage is None or entry[0] == stage]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+
+class SqlitePlanningCache(PlanningCache):
+    def __init__(self, cache_path: str = DEFAULT_CACHE_PATH, ttl_seconds: float | None = DEFAULT_TTL_SECONDS):
+        super().__init__(ttl_seconds=ttl_seconds)
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS planning_cache (key TEXT PRIMARY KEY, stage TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._connection.commit()
+
+    def get_entry(self, key: str) -> tuple[str, str, float | None] | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT stage, value, expires_at FROM planning_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return row[0], row[1], row[2]
+
+    def set(self, key: str, stage: str, value: str, expires_at: float | None = None):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO planning_cache (key, stage, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, stage, value, self._expires_at(expires_at))
+            )
+            # Expired rows are never read again, clear them out on write
+            self._connection.execute("DELETE FROM planning_cache WHERE expires_at <= ?", (time.time(),))
+            self._connection.commit()
+
+    def invalidate(self, stage: str | None = None) -> int:
+        with self._lock:
+            if stage is None:
+                cursor = self._connection.execute("DELETE FROM planning_cache")
+            else:
+                cursor = self._connection.execute("DELETE FROM planning_cache WHERE stage = ?", (stage,))
+            self._connection.commit()
+        return cursor.rowcount
+
+
+class TieredPlanningCache(PlanningCache):
+    """Checks the caches in order, e.g. an in-memory LRU in front of SQLite, and backfills the faster tiers.
+
+    Backfilled entries keep the expiry of the tier they were found in, so a hit never extends their life.
+    """
+
+    def __init__(self, caches: list[PlanningCache]):
+        super().__init__(ttl_seconds=None)
+        self.caches = caches
+
+    def get_entry(self, key: str) -> tuple[str, str, float | None] | None:
+        for index, cache in enumerate(self.caches):
+            entry = cache.get_entry(key)
+            if entry is not None:
+                for faster_cache in self.caches[:index]:
+                    faster_cache.set(key, *entry)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, stage: str, value: str, expires_at: float | None = None):
+        for cache in self.caches:
+            cache.set(key, stage, value, expires_at)
+
+    def invalidate(self, stage: str | None = None) -> int:
+        removed = max((cache.invalidate(stage) for cache in self.caches), default=0)
+        logger.info("Invalidated %s planning cache entries for %s", removed, f"stage {stage}" if stage else "all stages")
+        return removed
+
+    def stats(self) -> dict:
+        return {**super().stats(), "tiers": [cache.stats() for cache in self.caches]}
@@ -1,6 +1,10 @@
+import asyncio
 import logging
+from typing import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
 from langchain_openai import OpenAIEmbeddings
 from services.vector_store import VectorStore
+from services.backends.base import VectorBackend
 from model.response_model import RAGResponse
 from tools.query_augmentation_tool import QueryAugmentationTool
 from config.openai_config import openapi_client
@@ -9,57 +13,136 @@ from langchain.schema import Document
 from model.relevant_content_model import RelevantContent
 from tools.planning_tool import PlanningTool
 from langchain_core.prompts import PromptTemplate
+from langchain.schema.runnable import RunnableSequence
 from model.anonymize_model import DeanonymizedPlan
 from langchain_openai import ChatOpenAI
 from langchain_ollama import OllamaEmbeddings
 from model.plan_model import Plan
+from model.fast_plan_model import FastPlan
 from prompts.prompt_manager import PromptManager
+from services.planning_cache import PlanningCache
+from services.context_builder import BuiltContext, ContextBuilder, Passage
+from tools.relevance_filter import RelevanceFilter
+from services.retrieval_memo import RetrievalMemo
+from services.rank_fusion import fused_order
+from config.metrics import span
 
 
 logger = logging.getLogger("ApplicationService")
 
+# Hits per query and collection, and the number of fused documents handed to the final prompt
+RETRIEVAL_K = 5
+RETRIEVAL_TOP_K = 10
+
 class RagService:
     def __init__(self):
-        self.vectorstore = VectorStore()
+        self.vectorstore = None
         self.planning_tool = None
+        self.planning_cache = None
         self.question = None
         self.plan_obj = None
         self.queries = []
         self.llm = None
         self.should_use_anonymized_planning = False
+        self.should_use_fast_planning = False
+        self.should_use_speculative_retrieval = True
+        self.planning_deadline = None
+        self.top_k = RETRIEVAL_TOP_K
+        self.context_builder = ContextBuilder()
+        self.context: BuiltContext | None = None
+        self.relevance_filter = None
+        self.retrieval_memo = None
+        # Called with (stage, payload) as the async chain finishes each stage, see astream
+        self.stage_listener: Callable[[str, object], None] | None = None
         logger.info("[bold green]RAG Service initialized[/bold green]")
 
-    def with_llm(self, model: ChatOpenAI, embeddings: OllamaEmbeddings, temperature=0):
+    def with_llm(self, model: ChatOpenAI, embeddings: OllamaEmbeddings = None, temperature=0):
+        if self.vectorstore is None:
+            # Checked before the try below, which would turn it into a silently missing LLM
+            logger.error("with_llm was called before with_vectorstore.")
+            raise ValueError("Call with_vectorstore before with_llm, the LLM is used to initialize the vectorstore")
+
         try:
-            logger.info(f"[bold green]Configuring LLM with model: {model.model_name}[/bold green]")
+            logger.info("[bold green]Configuring LLM with model: %s[/bold green]", model.model_name)
             self.llm = model
-            self.planning_tool = PlanningTool(llm=self.llm)
-            self.vectorstore._initialize_vectorstore(llm=self.llm, embeddings=embeddings)
+            self.planning_tool = PlanningTool(llm=self.llm, cache=self.planning_cache)
+            # The vectorstore is opened once per process, this only covers callers that skipped startup
+            if not self.vectorstore.is_initialized:
+                self.vectorstore.initialize(llm=self.llm, embeddings=embeddings)
         except Exception as e:
-            logger.error(f"Error configuring LLM: {e}")
+            logger.error("Error configuring LLM: %s", e)
             self.llm = None
         return self
 
-    def with_vectorstore(self, vectorstore: VectorStore):
+    def with_vectorstore(self, vectorstore: VectorStore | dict[str, VectorBackend]):
+        """Use a VectorStore, or raw VectorBackends keyed by collection, e.g. {"chunk": ..., "quote": ...}."""
+        if isinstance(vectorstore, dict) and all(isinstance(backend, VectorBackend) for backend in vectorstore.values()):
+            vectorstore = VectorStore(backends=vectorstore, lexical_directory=None)
+
         if not isinstance(vectorstore, VectorStore):
-            logger.error("Provided vectorstore is not an instance of VectorStore.")
-            raise ValueError("Provided vectorstore is not an instance of VectorStore")
+            logger.error("Provided vectorstore is not a VectorStore or a mapping of VectorBackends.")
+            raise ValueError("Provided vectorstore is not a VectorStore or a mapping of VectorBackends")
 
         self.vectorstore = vectorstore
         return self
 
+    def with_planning_cache(self, cache: PlanningCache):
+        self.planning_cache = cache
+        if self.planning_tool is not None:
+            self.planning_tool.cache = cache
+        return self
+
     def with_anonymized_planning(self):
         self.should_use_anonymized_planning = True
+        self.should_use_fast_planning = False
         logger.info("[bold green]Anonymized planning enabled.[/bold green]")
         return self
 
+    def with_fast_planning(self):
+        """Plan and generate queries in a single LLM call instead of the four-stage anonymized chain."""
+        self.should_use_fast_planning = True
+        self.should_use_anonymized_planning = False
+        logger.info("[bold green]Fast planning enabled.[/bold green]")
+        return self
+
+    def with_speculative_retrieval(self, enabled: bool = True):
+        """Search with the raw question while planning runs and merge those results with the planned ones."""
+        self.should_use_speculative_retrieval = enabled
+        return self
+
+    def with_planning_deadline(self, seconds: float | None):
+        """Answer from the speculative results alone if planning takes longer than this.
+
+        Only applies to arun with speculative retrieval, a planning thread in run cannot be cancelled.
+        """
+        self.planning_deadline = seconds
+        return self
+
+    def with_top_k(self, top_k: int):
+        self.top_k = top_k
+        return self
+
+    def with_relevance_filter(self, relevance_filter: RelevanceFilter | None = None):
+        """Drop stitched passages far from every query, scored with the stored chunk vectors. Off unless called."""
+        self.relevance_filter = relevance_filter or RelevanceFilter()
+        return self
+
+    def with_retrieval_memo(self, memo: RetrievalMemo):
+        """Share query lookups with the other services using the same memo, e.g. the questions of one batch."""
+        self.retrieval_memo = memo
+        return self
+
+    def with_context_budget(self, token_budget: int):
+        self.context_builder = ContextBuilder(token_budget=token_budget)
+        return self
+
     def with_question(self, question):
         if not question:
             logger.error("Question cannot be empty.")
             raise ValueError("Question cannot be empty")
 
         self.question = question
-        logger.info(f"[bold green]Question set:[/bold green] {question}")
+        logger.info("[bold green]Question set:[/bold green] %s", question)
         return self
 
     def create_queries_from_plan(self):
@@ -72,9 +155,9 @@ class RagService:
                 mapping=anonymized_question_obj.mapping
             )
 
-            logger.info(f"Plan created with {len(self.plan_obj.steps)} steps:")
+            logger.info("Plan created with %s steps:", len(self.plan_obj.steps))
             for step in enumerate(self.plan_obj.steps):
-                logger.info(f"[bold green][{step}][/bold green]")
+                logger.info("[bold green][%s][/bold green]", step)
 
             queries_obj = self.planning_tool.create_queries_from_plan(
                 question=self.question,
@@ -83,13 +166,67 @@ class RagService:
 
             self.queries = queries_obj.queries
 
-            logger.info(f"Generated {len(self.queries)} queries from plan:")
+            logger.info("Generated %s queries from plan:", len(self.queries))
+            for query in self.queries:
+                logger.info("[bold green][%s][/bold green]", query)
+        except Exception as e:
+            logger.error("Error creating queries from plan: %s", e)
+            raise
+
+    async def acreate_queries_from_plan(self):
+        try:
+            anonymized_question_obj = await self.planning_tool.aanonymize_question(self.question)
+            anonymized_plan = await self.planning_tool.acreate_initial_plan(anonymized_question_obj.anonymized_question)
+
+            self.plan_obj: Plan = await self.planning_tool.adeanonymize_plan(
+                plan=anonymized_plan.steps,
+                mapping=anonymized_question_obj.mapping
+            )
+
+            logger.info("Plan created with %s steps:", len(self.plan_obj.steps))
+            for step in enumerate(self.plan_obj.steps):
+                logger.info("[bold green][%s][/bold green]", step)
+
+            queries_obj = await self.planning_tool.acreate_queries_from_plan(
+                question=self.question,
+                plan=self.plan_obj
+            )
+
+            self.queries = queries_obj.queries
+
+            logger.info("Generated %s queries from plan:", len(self.queries))
             for query in self.queries:
-                logger.info(f"[bold green][{query}][/bold green]")
+                logger.info("[bold green][%s][/bold green]", query)
+        except Exception as e:
+            logger.error("Error creating queries from plan: %s", e)
+            raise
+
+    def create_fast_plan(self):
+        try:
+            fast_plan = self.planning_tool.create_fast_plan(self.question)
+            self.apply_fast_plan(fast_plan)
+        except Exception as e:
+            logger.error("Error creating fast plan: %s", e)
+            raise
+
+    async def acreate_fast_plan(self):
+        try:
+            fast_plan = await self.planning_tool.acreate_fast_plan(self.question)
+            self.apply_fast_plan(fast_plan)
         except Exception as e:
-            logger.error(f"Error creating queries from plan: {e}")
+            logger.error("Error creating fast plan: %s", e)
             raise
 
+    def apply_fast_plan(self, fast_plan: FastPlan):
+        self.plan_obj = Plan(steps=fast_plan.steps)
+        self.queries = fast_plan.queries
+
+        logger.info("Fast plan created with %s steps and %s queries:", len(self.plan_obj.steps), len(self.queries))
+        for step in enumerate(self.plan_obj.steps):
+            logger.info("[bold green][%s][/bold green]", step)
+        for query in self.queries:
+            logger.info("[bold green][%s][/bold green]", query)
+
     def generate_multiple_queries(self, prompt):
         self.queries = QueryAugmentationTool.generate_multiple_queries(llm=self.llm, question=self.question, prompt=prompt)
 
@@ -100,57 +237,226 @@ class RagService:
 
         try:
             logger.info("[bold yellow]<-- Executing RAG chain -->[/bold yellow]")
-            # Create queries from plan if anonymized planning is enabled
-            if self.should_use_anonymized_planning:
-                self.create_queries_from_plan()
-            else:
-                self.queries = [self.question]
-            
-            # Retrieve documents from vectorstore using the chunk and quote retrievers
-            retrieved_chunks: list[Document] = self.vectorstore \
-                .search_for_documents(
-                    queries=self.queries, 
-                    retriever="chunk",
-                    k=5
-                )
-            logger.info(f"Retrieved {len(retrieved_chunks)} chunk documents.")
-
-            retrieved_quotes: list[Document] = self.vectorstore \
-                .search_for_documents(
-                    queries=self.queries, 
-                    retriever="quote",
-                    k=5
-                )
-            logger.info(f"Retrieved {len(retrieved_quotes)} quote documents.")
-            docs = retrieved_chunks + retrieved_quotes
-            logger.info(f"Retrieved a total of {len(docs)} documents from vectorstore.")
-
-            # Remove irrelevant content from retrieved documents
-            """
-            relevant_content_as_string: str = self.vectorstore.remove_irrelevant_content(
-                queries=self.queries, 
-                retrieved_documents=docs
-            )
-            logger.info("Content retrieved: %s", relevant_content_as_string)
-            """
+            # Retrieve documents from the chunk and quote collections, embedding each query once and fusing the rankings
+            with span("retrieve"):
+                retrieved = self.retrieve()
+            logger.info("Retrieved %s chunk documents.", len(retrieved["chunk"]))
+            logger.info("Retrieved %s quote documents.", len(retrieved["quote"]))
+            # Chunks and quotes in their fused order, so a top quote is not packed after every chunk
+            docs = fused_order(retrieved)
+            logger.info("Retrieved a total of %s documents from vectorstore.", len(docs))
+
+            # Stitch overlapping chunks, then drop passages far from the queries when the filter is on
+            passages = self.select_passages(retrieved, docs)
 
             # Generate final answer using the LLM and the provided prompt
-            final_chain = PromptTemplate(
-                input_variables=["context", "plan", "original_question", "generated_queries_from_plan"],
-                template=prompt
-            ) | self.llm.with_structured_output(RAGResponse)
-     
-            answer = final_chain.invoke({
-                "context": docs,
-                "plan": self.plan_obj.steps,
-                "original_question": self.question,
-                "generated_queries_from_plan": self.queries
-            })
-            logger.info(f"[bold blue]Final answer: {answer}[/bold blue]")
+            with span("build_context"):
+                final_input = self.build_final_input(passages)
+            with span("final_answer"):
+                answer = self.build_final_chain(prompt).invoke(final_input)
+            logger.info("[bold blue]Final answer: %s[/bold blue]", answer)
             logger.info("[bold green]RAG chain executed successfully.[/bold green]")
             
             return answer
             
         except Exception as e:
-            logger.error(f"Error executing RAG chain: {e}")
-            raise
\ No newline at end of file
+            logger.error("Error executing RAG chain: %s", e)
+            raise
+
+    async def arun(self, prompt) -> RAGResponse:
+        if not self.llm:
+            return "Error: LLM not available"
+
+        try:
+            logger.info("[bold yellow]<-- Executing async RAG chain -->[/bold yellow]")
+            # One batched embedding call, then all chunk and quote lookups run concurrently
+            with span("retrieve"):
+                retrieved = await self.aretrieve()
+            logger.info("Retrieved %s chunk documents.", len(retrieved["chunk"]))
+            logger.info("Retrieved %s quote documents.", len(retrieved["quote"]))
+            # Chunks and quotes in their fused order, so a top quote is not packed after every chunk
+            docs = fused_order(retrieved)
+            logger.info("Retrieved a total of %s documents from vectorstore.", len(docs))
+
+            passages = await self.aselect_passages(retrieved, docs)
+
+            with span("build_context"):
+                final_input = self.build_final_input(passages)
+            with span("final_answer"):
+                answer = await self.build_final_chain(prompt).ainvoke(final_input)
+            logger.info("[bold blue]Final answer: %s[/bold blue]", answer)
+            logger.info("[bold green]RAG chain executed successfully.[/bold green]")
+
+            return answer
+
+        except Exception as e:
+            logger.error("Error executing RAG chain: %s", e)
+            raise
+
+    def create_plan(self):
+        if self.should_use_fast_planning:
+            self.create_fast_plan()
+        else:
+            self.create_queries_from_plan()
+
+    async def acreate_plan(self):
+        if self.should_use_fast_planning:
+            await self.acreate_fast_plan()
+        else:
+            await self.acreate_queries_from_plan()
+
+    def retrieve(self) -> dict[str, list[Document]]:
+        if not (self.should_use_fast_planning or self.should_use_anonymized_planning):
+            self.queries = [self.question]
+            return self.vectorstore.search_collections(queries=self.queries, k=RETRIEVAL_K, top_k=self.top_k)
+
+        if not self.should_use_speculative_retrieval:
+            self.create_plan()
+            return self.vectorstore.search_collections(queries=self.queries, k=RETRIEVAL_K, top_k=self.top_k)
+
+        # The raw question is searched on a side thread while the planning calls run here
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative-retrieval") as pool:
+            speculative = pool.submit(self.vectorstore.search_collections, queries=[self.question], k=RETRIEVAL_K, top_k=self.top_k)
+            self.create_plan()
+            planned = self.vectorstore.search_collections(queries=self.queries, k=RETRIEVAL_K, top_k=self.top_k)
+            return self.vectorstore.merge_results(planned, speculative.result(), top_k=self.top_k)
+
+    async def aretrieve(self) -> dict[str, list[Document]]:
+        if not (self.should_use_fast_planning or self.should_use_anonymized_planning):
+            self.queries = [self.question]
+            self.emit_plan()
+            return await self.vectorstore.asearch_collections(queries=self.queries, k=RETRIEVAL_K, top_k=self.top_k, memo=self.retrieval_memo)
+
+        if not self.should_use_speculative_retrieval:
+            await self.acreate_plan()
+            self.emit_plan()
+            return await self.vectorstore.asearch_collections(queries=self.queries, k=RETRIEVAL_K, top_k=self.top_k, memo=self.retrieval_memo)
+
+        # The raw question is already a good query, search with it while the planner works
+        speculative = asyncio.create_task(self.vectorstore.asearch_collections(queries=[self.question], k=RETRIEVAL_K, top_k=self.top_k, memo=self.retrieval_memo))
+        try:
+            await asyncio.wait_for(self.acreate_plan(), timeout=self.planning_deadline)
+        except asyncio.TimeoutError:
+            logger.warning("Planning exceeded %ss, answering from the question alone", self.planning_deadline)
+            self.plan_obj = None
+            self.queries = [self.question]
+            self.emit_plan()
+            return await speculative
+        except Exception:
+            speculative.cancel()
+            raise
+
+        self.emit_plan()
+        planned = await self.vectorstore.asearch_collections(queries=self.queries, k=RETRIEVAL_K, top_k=self.top_k, memo=self.retrieval_memo)
+        return self.vectorstore.merge_results(planned, await speculative, top_k=self.top_k)
+
+    def emit(self, stage: str, payload):
+        if self.stage_listener is not None:
+            self.stage_listener(stage, payload)
+
+    def emit_plan(self):
+        self.emit("plan", {"steps": self.plan_obj.steps if self.plan_obj else []})
+        self.emit("queries", {"queries": list(self.queries)})
+
+    async def astream(self, prompt) -> AsyncIterator[tuple[str, object]]:
+        """Run the async chain and yield (event, payload) pairs as it goes.
+
+        Yields "plan" and "queries" once planning is done, "retrieved" with the passages of the
+        final context, a "token" for every chunk the final LLM call streams, and the RAGResponse
+        as "response" last. A failure ends the stream with an "error" event.
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        self.stage_listener = lambda stage, payload: events.put_nowait((stage, payload))
+
+        async def run_chain():
+            try:
+                if not self.llm:
+                    raise RuntimeError("LLM not available")
+
+                logger.info("[bold yellow]<-- Executing streaming RAG chain -->[/bold yellow]")
+                with span("retrieve"):
+                    retrieved = await self.aretrieve()
+                docs = fused_order(retrieved)
+                logger.info("Retrieved a total of %s documents from vectorstore.", len(docs))
+
+                passages = await self.aselect_passages(retrieved, docs)
+
+                with span("build_context"):
+                    final_input = self.build_final_input(passages)
+                self.emit("retrieved", {
+                    "passages": [{"rank": p.rank, "source": p.source, "text": p.text} for p in self.context.passages],
+                    "dropped": self.context.dropped
+                })
+
+                answer = None
+                with span("final_answer"):
+                    async for event in self.build_final_chain(prompt).astream_events(final_input, version="v2"):
+                        if event["event"] == "on_chat_model_stream":
+                            # Structured output arrives as tool call argument chunks, plain output as content
+                            chunk = event["data"]["chunk"]
+                            text = chunk.content if isinstance(chunk.content, str) else ""
+                            text += "".join(tool_call.get("args") or "" for tool_call in chunk.tool_call_chunks)
+                            if text:
+                                self.emit("token", {"text": text})
+                        elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+                            answer = event["data"]["output"]
+
+                logger.info("[bold green]Streaming RAG chain executed successfully.[/bold green]")
+                self.emit("response", answer)
+            except Exception as e:
+                logger.exception("Error executing streaming RAG chain: %s", e)
+                self.emit("error", {"detail": str(e)})
+            finally:
+                events.put_nowait(None)
+
+        task = asyncio.create_task(run_chain())
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            await task
+        finally:
+            # The client went away mid-stream, stop spending LLM calls on it
+            if not task.done():
+                task.cancel()
+
+    def build_final_chain(self, prompt: str) -> RunnableSequence:
+        return PromptTemplate(
+            input_variables=["context", "plan", "original_question", "generated_queries_from_plan"],
+            template=prompt
+        ) | self.llm.with_structured_output(RAGResponse)
+
+    def select_passages(self, retrieved: dict[str, list[Document]], docs: list[Document]) -> list[Passage]:
+        with span("stitch"):
+            passages = self.context_builder.passages(docs)
+        if self.relevance_filter is None:
+            return passages
+
+        with span("relevance_filter"):
+            # The queries were embedded for retrieval, so these are embedding cache hits
+            embeddings = self.vectorstore.snapshot.embeddings
+            query_vectors = embeddings.embed_documents(self.queries)
+            passages = self.relevance_filter.filter(query_vectors, passages, self.vectorstore.stored_vectors(retrieved))
+            return self.relevance_filter.prune_sentences(query_vectors, passages, embeddings)
+
+    async def aselect_passages(self, retrieved: dict[str, list[Document]], docs: list[Document]) -> list[Passage]:
+        with span("stitch"):
+            passages = self.context_builder.passages(docs)
+        if self.relevance_filter is None:
+            return passages
+
+        with span("relevance_filter"):
+            embeddings = self.vectorstore.snapshot.embeddings
+            query_vectors = await embeddings.aembed_documents(self.queries)
+            vectors_by_id = await asyncio.to_thread(self.vectorstore.stored_vectors, retrieved)
+            passages = self.relevance_filter.filter(query_vectors, passages, vectors_by_id)
+            return await self.relevance_filter.aprune_sentences(query_vectors, passages, embeddings)
+
+    def build_final_input(self, passages: list[Passage]) -> dict:
+        # Numbered passages within the token budget instead of the raw Document reprs
+        self.context = self.context_builder.pack(passages)
+        return {
+            "context": self.context.text,
+            "plan": self.plan_obj.steps if self.plan_obj else [],
+            "original_question": self.question,
+            "generated_queries_from_plan": self.queries
+        }
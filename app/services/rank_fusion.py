@@ -0,0 +1,74 @@
+import hashlib
+from typing import Iterable
+from langchain.docstore.document import Document
+
+# Damping constant from the original Reciprocal Rank Fusion paper, keeps one top hit from dominating
+RRF_K = 60
+# Metadata key of the fused score, so the global order survives grouping by collection
+RRF_SCORE_KEY = "rrf_score"
+
+
+def document_key(document: Document) -> str:
+    """The stored id when the vector store returned one, otherwise a hash of the content."""
+    document_id = getattr(document, "id", None)
+    if document_id:
+        return document_id
+    return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+
+def unique_documents(documents: Iterable[Document]) -> list[Document]:
+    """Drop repeated documents in one pass, keeping the first occurrence and the original order."""
+    unique = {}
+    for document in documents:
+        unique.setdefault(document_key(document), document)
+    return list(unique.values())
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[tuple[str, list[Document]]],
+    top_k: int | None = None,
+    rrf_k: int = RRF_K
+) -> dict[str, list[Document]]:
+    """Fuse ranked result lists from several queries and collections into one global ranking.
+
+    rankings are (collection, documents) pairs, each list ordered best first. A document
+    scores 1 / (rrf_k + rank) in every list it appears in, so documents that several queries
+    agree on rise to the top. The top_k best across all collections are kept and handed
+    back grouped by collection, best first, as copies carrying their score in
+    metadata[RRF_SCORE_KEY]. fused_order restores the order across collections.
+    """
+    scores: dict[str, float] = {}
+    documents: dict[str, tuple[str, Document]] = {}
+    collections = []
+
+    for collection, ranked in rankings:
+        if collection not in collections:
+            collections.append(collection)
+
+        seen = set()
+        for rank, document in enumerate(ranked, start=1):
+            key = document_key(document)
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, (collection, document))
+
+    # sorted is stable, ties keep the order the documents were first seen in
+    ranked_keys = sorted(scores, key=scores.get, reverse=True)
+    if top_k is not None:
+        ranked_keys = ranked_keys[:top_k]
+
+    fused = {collection: [] for collection in collections}
+    for key in ranked_keys:
+        collection, document = documents[key]
+        fused[collection].append(document.model_copy(update={"metadata": {**document.metadata, RRF_SCORE_KEY: scores[key]}}))
+
+    return fused
+
+
+def fused_order(results: dict[str, list[Document]]) -> list[Document]:
+    """All collections of a fused result in one list, best fused score first."""
+    documents = [document for ranked in results.values() for document in ranked]
+    # sorted is stable, equal scores keep their collection order
+    return sorted(documents, key=lambda document: document.metadata.get(RRF_SCORE_KEY, 0.0), reverse=True)
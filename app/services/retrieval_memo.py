@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable
+from langchain.docstore.document import Document
+
+# The rankings one query contributes, as (collection, documents) pairs
+QueryRankings = list[tuple[str, list[Document]]]
+
+
+class RetrievalMemo:
+    """Per-query retrieval results shared by every question of one batch.
+
+    The first caller to need a query starts the search for it, later and concurrent callers
+    await the same future, so a query that several plans produce is embedded and searched once.
+    Queries that are still missing are searched together, keeping one embedding call per lookup.
+    Searches run in their own task and callers await them shielded, so cancelling one question
+    never cancels a search other questions wait on. Meant to live as long as one batch, entries
+    are never evicted.
+    """
+
+    def __init__(self):
+        self._results: dict[tuple, asyncio.Future] = {}
+        # Strong references to running searches, the event loop only keeps weak ones
+        self._searches: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def rankings(
+        self,
+        queries: list[str],
+        k: int,
+        collections,
+        search: Callable[[list[str]], Awaitable[list[QueryRankings]]]
+    ) -> list[QueryRankings]:
+        """Rankings for every query, in order. search gets the queries nobody has searched yet."""
+        loop = asyncio.get_running_loop()
+        keys = [(query, k, tuple(collections)) for query in queries]
+
+        owned = {}
+        for query, key in zip(queries, keys):
+            if key in self._results:
+                self.hits += 1
+            elif key not in owned:
+                self.misses += 1
+                owned[key] = query
+                self._results[key] = loop.create_future()
+
+        # Taken before the search starts, a failed search removes its keys from the memo
+        futures = [self._results[key] for key in keys]
+        if owned:
+            task = loop.create_task(self._search(owned, search))
+            self._searches.add(task)
+            task.add_done_callback(self._searches.discard)
+
+        return [await asyncio.shield(future) for future in futures]
+
+    async def _search(self, owned: dict[tuple, str], search: Callable[[list[str]], Awaitable[list[QueryRankings]]]):
+        try:
+            found = await search(list(owned.values()))
+        except (Exception, asyncio.CancelledError) as e:
+            # Waiters get the same failure, and a later call searches again
+            for key in owned:
+                future = self._results.pop(key)
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # Retrieved here, so an unawaited future does not log a warning
+                    future.exception()
+            return
+
+        for key, query_rankings in zip(owned, found):
+            self._results[key].set_result(query_rankings)
+
+    def stats(self) -> dict:
+        return {"queries": len(self._results), "hits": self.hits, "misses": self.misses}
@@ -1,131 +1,421 @@
 from langchain_community.document_loaders import JSONLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
 from pathlib import Path
 from langchain.docstore.document import Document
-from tools.embedding_tool import EmbeddingTool
+from tools.batching_embedder import BatchingEmbedder, EmbeddingBatch
 from prompts.prompt_manager import remove_irrelevant_content_prompt
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from model.relevant_content_model import RelevantContent
-from fastapi import UploadFile
+from model.ingestion_model import IngestionReport
+from services.rank_fusion import reciprocal_rank_fusion, unique_documents
+from services.bm25_index import BM25Index, LEXICAL_INDEX_DIRECTORY
+from services.backends.base import VectorBackend
+from services.backends.chroma_backend import ChromaBackend
+from services.backends.flat_backend import FlatBackend
+from services.backends.memory_backend import InMemoryBackend
+from services.retrieval_memo import QueryRankings, RetrievalMemo
+from config.metrics import span
 from langchain_ollama import OllamaEmbeddings
+from langchain_core.embeddings import Embeddings
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+import asyncio
+import hashlib
 import logging
-import warnings
-from json import dumps, loads
+import os
+import threading
+import time
 
 logger = logging.getLogger("ApplicationService")
 
+CHUNK_PERSIST_DIRECTORY = "./chroma/chunk_chroma_db"
+QUOTE_PERSIST_DIRECTORY = "./chroma/quote_chroma_db"
+FLAT_CHUNK_DIRECTORY = "./chroma/chunk_flat_db"
+FLAT_QUOTE_DIRECTORY = "./chroma/quote_flat_db"
+# "chroma" (HNSW, persistent client), "flat" (exact search over a memory-mapped matrix) or "memory" (nothing on disk)
+VECTOR_BACKENDS = ("chroma", "flat", "memory")
+COLLECTIONS = ("chunk", "quote")
+QUOTE_PATTERN = r'Venstre (?:vil|ønsker)[^.]*\.'
+# Documents per commit of an ingestion stream, each commit is embedded in smaller batches
+INGESTION_BATCH_SIZE = 256
+
+
+def document_id(source: str, text: str) -> str:
+    """Deterministic id from the source and chunk text, so re-ingesting a chunk maps to the same entry."""
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class VectorStoreSnapshot:
+    """Immutable set of opened collections, swapped as a whole."""
+    backends: dict[str, VectorBackend]
+    embeddings: Embeddings
+    batching_embedder: BatchingEmbedder
+    # BM25 index per collection, searched next to the dense vectors
+    lexical_indexes: dict[str, BM25Index] = field(default_factory=dict)
+
+    def collection(self, name: str) -> VectorBackend:
+        if name not in self.backends:
+            raise ValueError(f"Unknown collection: {name}")
+        return self.backends[name]
+
+
 class VectorStore:
-    def __init__(self):
-        self.chunk_vectorstore = None
-        self.quote_vectorstore = None
-        self.chunk_retriever = None
-        self.quote_retriever = None
-        self.embedder = EmbeddingTool()
+    """Chunk and quote collections on a pluggable VectorBackend.
+
+    backend names the storage engine to open, "chroma" by default or VECTOR_BACKEND. Already
+    opened backends can be passed instead, one per collection, e.g. InMemoryBackends for tests.
+    """
+
+    def __init__(
+        self,
+        backend: str | None = None,
+        backends: dict[str, VectorBackend] | None = None,
+        lexical_directory: str | None = LEXICAL_INDEX_DIRECTORY
+    ):
+        self.backend = backend or os.environ.get("VECTOR_BACKEND", "chroma")
+        self._backends = backends
+        # BM25 indexes are persisted here, None keeps them in memory only
+        self.lexical_directory = lexical_directory
+        self._snapshot: VectorStoreSnapshot | None = None
+        # Serializes ingestion and reloads; searches never take it
+        self._write_lock = threading.RLock()
         self.llm = None
 
+    @property
+    def snapshot(self) -> VectorStoreSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Vectorstore is not initialized")
+        return snapshot
 
-    def _initialize_vectorstore(self, llm: ChatOpenAI, embeddings=OllamaEmbeddings(model="mxbai-embed-large")):
-        try:            
-            self.llm = llm
+    @property
+    def is_initialized(self) -> bool:
+        return self._snapshot is not None
 
-            # Initialize the vectorstore for storing chunks of text
-            self.chunk_vectorstore = Chroma(
-                embedding_function=embeddings,
-                persist_directory="./chroma/chunk_chroma_db"
-            )
-            self.chunk_retriever = self.chunk_vectorstore.as_retriever(search_kwargs={"k": 5})
+    @classmethod
+    def in_memory(cls) -> "VectorStore":
+        """A VectorStore that keeps vectors and lexical indexes in memory and never touches disk."""
+        return cls(backends={collection: InMemoryBackend() for collection in COLLECTIONS}, lexical_directory=None)
 
-            #Initialize the vectorstore for storing quotes
-            self.quote_vectorstore = Chroma(
-                embedding_function=embeddings,
-                persist_directory="./chroma/quote_chroma_db"
-            )
-            self.quote_retriever = self.quote_vectorstore.as_retriever(search_kwargs={"k": 5})
+    @property
+    def chunk_vectorstore(self) -> VectorBackend:
+        return self.snapshot.collection("chunk")
+
+    @property
+    def quote_vectorstore(self) -> VectorBackend:
+        return self.snapshot.collection("quote")
+
+    def initialize(self, llm: ChatOpenAI, embeddings: Embeddings):
+        """Open the collections once per process. Later calls are no-ops."""
+        if self._snapshot is not None:
+            return
+
+        with self._write_lock:
+            if self._snapshot is None:
+                self._initialize_vectorstore(llm=llm, embeddings=embeddings)
 
-            test_results = self.chunk_vectorstore.similarity_search("test", k=1)
-            if test_results:
-                pass
-            else:
-                pass
+    def reload(self):
+        """Reopen the collections, e.g. after they were rebuilt on disk."""
+        self._initialize_vectorstore(llm=self.llm, embeddings=self.snapshot.embeddings)
+
+    def _initialize_vectorstore(self, llm: ChatOpenAI, embeddings=OllamaEmbeddings(model="mxbai-embed-large")):
+        try:
+            with self._write_lock:
+                self.llm = llm
+                snapshot = self._open_snapshot(embeddings)
+                # Single reference assignment, in-flight searches keep the snapshot they started with
+                previous, self._snapshot = self._snapshot, snapshot
+                if previous is not None:
+                    # Ingestion holds the write lock too, so nothing is embedding through the old snapshot
+                    previous.batching_embedder.shutdown()
 
             logger.info("[bold green]Vectorstore initialized successfully.[/bold green]")
         except Exception as e:
-            logger.error(f"Error initializing vectorstore: {e}")
-            self.chunk_retriever = None
+            logger.error("Error initializing vectorstore: %s", e)
             raise
 
-    # Endre så den tar embedding pattern som parameter
-    def add_document_to_store(self, embedding_type: str, file: UploadFile):
+    def _open_snapshot(self, embeddings: Embeddings) -> VectorStoreSnapshot:
+        backends = self._open_backends()
+        return VectorStoreSnapshot(
+            backends=backends,
+            embeddings=embeddings,
+            batching_embedder=BatchingEmbedder(
+                embeddings=embeddings,
+                batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", "32")),
+                max_in_flight=int(os.environ.get("EMBEDDING_MAX_IN_FLIGHT", "4"))
+            ),
+            lexical_indexes={collection: self._open_lexical_index(collection, backend) for collection, backend in backends.items()}
+        )
+
+    def _open_backends(self) -> dict[str, VectorBackend]:
+        if self._backends is not None:
+            return self._backends
+
+        if self.backend == "chroma":
+            return {"chunk": ChromaBackend(CHUNK_PERSIST_DIRECTORY), "quote": ChromaBackend(QUOTE_PERSIST_DIRECTORY)}
+        if self.backend == "flat":
+            return {"chunk": FlatBackend(FLAT_CHUNK_DIRECTORY), "quote": FlatBackend(FLAT_QUOTE_DIRECTORY)}
+        if self.backend == "memory":
+            # Kept across reloads, a fresh in-memory backend would be empty
+            self._backends = {collection: InMemoryBackend() for collection in COLLECTIONS}
+            return self._backends
+
+        raise ValueError(f"Unknown vector backend: {self.backend}, expected one of {VECTOR_BACKENDS}")
+
+    def _open_lexical_index(self, collection: str, backend: VectorBackend) -> BM25Index:
+        if self.lexical_directory is None:
+            index = BM25Index()
+        else:
+            index = BM25Index.load(os.path.join(self.lexical_directory, f"{collection}.json"))
+
+        if index.count() != backend.count():
+            # Built before the lexical index existed, or for another backend, index the stored documents once
+            index = BM25Index(path=str(index.path) if index.path else None)
+            stored = backend.get(include=["documents", "metadatas"])
+            if stored["ids"]:
+                index.add(ids=stored["ids"], texts=stored["documents"], metadatas=stored["metadatas"])
+            index.save()
+            logger.info("Built lexical index for the %s collection from %s stored documents", collection, index.count())
+        return index
+
+    def ingest_documents(
+        self,
+        source: str,
+        embedding_type: str,
+        documents: Iterable[tuple[str, Document]],
+        resume_from: int = 0,
+        on_commit: Callable[[int], None] | None = None
+    ) -> list[IngestionReport]:
+        """Write (collection, Document) pairs for one source, embedding each batch as soon as it is full.
+
+        Whenever a batch fills up, the pending documents of every collection are written together,
+        so after each write everything up to that position in the stream is committed. on_commit
+        receives that position, and a later call with resume_from set to it skips the committed
+        prefix without looking it up again.
+        """
         try:
-            logger.info(f"Adding document to vectorstore: {file.filename}")
-            text_chunks = self.embedder.create_chunks_from_document(
-                file=file,
-                chunk_size=1000
-            )
+            collections = COLLECTIONS if embedding_type == "both" else (embedding_type,)
+            reports = {collection: IngestionReport(source=source, collection=collection) for collection in collections}
+            seen_ids = {collection: set() for collection in collections}
+            batches = {collection: [] for collection in collections}
 
-            text_quotes = self.embedder.create_chunks_from_pattern(
-                file=file,
-                pattern=r'Venstre (?:vil|ønsker)[^.]*\.'
-            )
-           
-            if embedding_type == "both":
-                self.chunk_vectorstore.add_documents(text_chunks)
-                self.quote_vectorstore.add_documents(text_quotes)
+            def commit(position: int):
+                for collection in collections:
+                    self._ingest_batch(snapshot, collection, batches[collection], seen_ids[collection], reports[collection])
+                    batches[collection] = []
+                if on_commit:
+                    on_commit(position)
+
+            with self._write_lock:
+                snapshot = self.snapshot
+                position = 0
+
+                for position, (collection, document) in enumerate(documents, start=1):
+                    if collection not in batches:
+                        continue
+
+                    if position <= resume_from:
+                        # Committed by an earlier run, only keep it out of the stale set
+                        seen_ids[collection].add(document_id(source, document.page_content))
+                        continue
 
-            elif embedding_type == "chunk":
-                self.chunk_vectorstore.add_documents(text_chunks)
+                    batches[collection].append(document)
+                    if len(batches[collection]) >= INGESTION_BATCH_SIZE:
+                        commit(position)
 
-            elif embedding_type == "quote":
-                self.quote_vectorstore.add_documents(text_quotes)
+                commit(position)
+                for collection in collections:
+                    reports[collection].replaced = self._remove_stale(snapshot, collection, source, seen_ids[collection])
+                    if collection in snapshot.lexical_indexes:
+                        snapshot.lexical_indexes[collection].save()
 
-            logger.info(f"Document {file.filename} added successfully.")
+            for report in reports.values():
+                report.chunks_per_second = report.new / report.embedding_seconds if report.embedding_seconds else 0.0
+                logger.info("Ingested %s collection for %s: %s new, %s skipped, %s replaced (%.1f chunks/s)", report.collection, source, report.new, report.skipped, report.replaced, report.chunks_per_second)
+            logger.info("Document %s added successfully.", source)
+            return list(reports.values())
         except Exception as e:
-            logger.error(f"Error adding document {file.filename} to vectorstore: {e}")
+            logger.error("Error adding document %s to vectorstore: %s", source, e)
             raise
 
-    def search_for_documents(self, retriever: str, queries, k: int = 5) -> list[Document]:
-        all_docs = []
-        for i, query in enumerate(queries):
-            try:
-                if retriever == "chunk":
-                    found_docs = self.chunk_retriever.invoke(query)
-                else:
-                    found_docs = self.quote_retriever.invoke(query)
-                all_docs.extend(found_docs)
-                
-            except Exception as e:
-                logger.error(f"Error searching for documents with query '{query}': {e}")
-                # Continue with next query instead of failing completely
-
-
-        """# Apply relevance filtering to all documents at once
-        if all_docs:
-            try:
-                relevant_docs = self.remove_irrelevant_content(queries, all_docs)
-                return relevant_docs.relevant_content
-            except Exception as e:
-                logger.error(f"Error filtering relevant content: {e}")
-                # Fall back to returning all documents if filtering fails
-                return get_unique_union(all_docs)"""
-
-        return self.get_unique_union(all_docs)
-
-    def get_unique_union(self, documents: list[list]):
+    def _ingest_batch(self, snapshot: VectorStoreSnapshot, collection: str, documents: list[Document], seen_ids: set[str], report: IngestionReport):
+        """Add only chunks the collection has not seen, before they reach the embedder."""
+        store = snapshot.collection(collection)
+        documents_by_id = {}
+        for document in documents:
+            document.metadata["source"] = report.source
+            chunk_id = document_id(report.source, document.page_content)
+            # Identical chunks within one file collapse to the same id
+            if chunk_id not in seen_ids:
+                documents_by_id.setdefault(chunk_id, document)
+            seen_ids.add(chunk_id)
+
+        ids = list(documents_by_id)
+        existing_ids = set(store.get(ids=ids, include=[])["ids"]) if ids else set()
+        new_ids = [chunk_id for chunk_id in ids if chunk_id not in existing_ids]
+
+        report.skipped += len(documents) - len(new_ids)
+        if not new_ids:
+            return
+
+        def write(batch: EmbeddingBatch, vectors: list[list[float]]):
+            # The vectors are already computed, the backend only stores them
+            store.add(ids=batch.ids, vectors=vectors, documents=batch.texts, metadatas=batch.metadatas)
+            if collection in snapshot.lexical_indexes:
+                snapshot.lexical_indexes[collection].add(ids=batch.ids, texts=batch.texts, metadatas=batch.metadatas)
+            report.new += len(batch.ids)
+
+        start = time.perf_counter()
         try:
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore")
-                flattened_docs = [dumps(doc) for sublist in documents for doc in sublist]
-                # Get unique documents
-                unique_docs = list(set(flattened_docs))
-                # Return
-                return [loads(doc) for doc in unique_docs]
-        except Exception as e:
+            with span("ingest_embed"):
+                snapshot.batching_embedder.embed_and_write(
+                    ids=new_ids,
+                    texts=[documents_by_id[chunk_id].page_content for chunk_id in new_ids],
+                    metadatas=[documents_by_id[chunk_id].metadata for chunk_id in new_ids],
+                    write=write
+                )
+        finally:
+            report.embedding_seconds += time.perf_counter() - start
+
+    def _remove_stale(self, snapshot: VectorStoreSnapshot, collection: str, source: str, seen_ids: set[str]) -> int:
+        """Delete chunks stored for an earlier version of this source that the new version no longer has."""
+        store = snapshot.collection(collection)
+        previous_ids = set(store.get(where={"source": source}, include=[])["ids"])
+        stale_ids = list(previous_ids - seen_ids)
+        if stale_ids:
+            store.delete(stale_ids)
+            if collection in snapshot.lexical_indexes:
+                snapshot.lexical_indexes[collection].delete(stale_ids)
+
+        return len(stale_ids)
+
+    def search_for_documents(self, retriever: str, queries, k: int = 5, top_k: int | None = None) -> list[Document]:
+        """Search one collection, retriever is its name ("chunk" or "quote")."""
+        return self.search_collections(queries=list(queries), k=k, top_k=top_k, collections=(retriever,))[retriever]
+
+    async def asearch_for_documents(self, retriever: str, queries, k: int = 5, top_k: int | None = None) -> list[Document]:
+        return (await self.asearch_collections(queries=list(queries), k=k, top_k=top_k, collections=(retriever,)))[retriever]
+
+    def search_collections(self, queries: list[str], k: int = 5, top_k: int | None = None, collections=COLLECTIONS) -> dict[str, list[Document]]:
+        """Embed every query once and reuse the vectors for each collection.
+
+        k is the number of hits per query and collection, top_k caps the fused result across all of them.
+        """
+        snapshot = self.snapshot
+        with span("embed_queries"):
+            query_vectors = snapshot.embeddings.embed_documents(list(queries))
+
+        rankings = [
+            (collection, docs)
+            for collection in collections
+            for docs in self._search_by_vectors(snapshot.collection(collection), queries, query_vectors, k)
+        ]
+        rankings += self._lexical_rankings(snapshot, queries, k, collections)
+
+        return self.fuse_rankings(rankings, top_k=top_k, collections=collections)
+
+    async def asearch_collections(
+        self,
+        queries: list[str],
+        k: int = 5,
+        top_k: int | None = None,
+        collections=COLLECTIONS,
+        memo: RetrievalMemo | None = None
+    ) -> dict[str, list[Document]]:
+        """Embed all queries in one batch call and run every collection lookup concurrently.
+
+        With a memo, queries that another search already looked up reuse its rankings, only the rest are searched.
+        """
+        snapshot = self.snapshot
+        queries = list(queries)
+        if memo is None:
+            per_query = await self._asearch_rankings(snapshot, queries, k, collections)
+        else:
+            per_query = await memo.rankings(
+                queries, k, collections,
+                search=lambda missing: self._asearch_rankings(snapshot, missing, k, collections)
+            )
+
+        rankings = [ranking for query_rankings in per_query for ranking in query_rankings]
+        return self.fuse_rankings(rankings, top_k=top_k, collections=collections)
+
+    async def _asearch_rankings(self, snapshot: VectorStoreSnapshot, queries: list[str], k: int, collections) -> list[QueryRankings]:
+        """The dense and lexical rankings of each query, one list of (collection, documents) pairs per query."""
+        # One round-trip to the embedding model for the whole batch instead of one per query and collection
+        with span("embed_queries"):
+            query_vectors = await snapshot.embeddings.aembed_documents(queries)
+
+        found = await asyncio.gather(*(
+            self._asearch_by_vectors(snapshot.collection(collection), queries, query_vectors, k)
+            for collection in collections
+        ))
+        # The lexical lookups are in-process and take microseconds, no need to leave the loop.
+        # They come back collection by collection, every query once per collection.
+        lexical = self._lexical_rankings(snapshot, queries, k, collections)
+
+        return [
+            [(collection, per_query[position]) for collection, per_query in zip(collections, found)]
+            + lexical[position::len(queries)]
+            for position in range(len(queries))
+        ]
+
+    def merge_results(self, *results: dict[str, list[Document]], top_k: int | None = None) -> dict[str, list[Document]]:
+        """Fuse already ranked per-collection results, e.g. the planned and the speculative search."""
+        collections = list(dict.fromkeys(collection for result in results for collection in result))
+        rankings = [(collection, docs) for result in results for collection, docs in result.items()]
+        return self.fuse_rankings(rankings, top_k=top_k, collections=collections)
+
+    def fuse_rankings(self, rankings: list[tuple[str, list[Document]]], top_k: int | None = None, collections=COLLECTIONS) -> dict[str, list[Document]]:
+        fused = reciprocal_rank_fusion(rankings, top_k=top_k)
+        # Every requested collection gets a key, even when nothing of it made the cut
+        return {collection: fused.get(collection, []) for collection in collections}
+
+    def _lexical_rankings(self, snapshot: VectorStoreSnapshot, queries: list[str], k: int, collections) -> list[tuple[str, list[Document]]]:
+        with span("lexical_search"):
+            return [
+                (collection, self._search_lexical(snapshot, collection, query, k))
+                for collection in collections
+                for query in queries
+            ]
+
+    def _search_lexical(self, snapshot: VectorStoreSnapshot, collection: str, query: str, k: int) -> list[Document]:
+        index = snapshot.lexical_indexes.get(collection)
+        if index is None:
             return []
+        return [document for document, _ in index.search(query, k=k)]
+
+    def _search_by_vectors(self, store: VectorBackend, queries: list[str], vectors: list[list[float]], k: int) -> list[list[Document]]:
+        try:
+            # Backends take the whole batch of query vectors in one call
+            with span("vector_search"):
+                return [[document for document, _ in hits] for hits in store.search_by_vector(vectors, k=k)]
+        except Exception as e:
+            logger.error("Error searching for documents with queries %s: %s", queries, e)
+            # Continue with the other collections instead of failing completely
+            return [[] for _ in queries]
+
+    async def _asearch_by_vectors(self, store: VectorBackend, queries: list[str], vectors: list[list[float]], k: int) -> list[list[Document]]:
+        return await asyncio.to_thread(self._search_by_vectors, store, queries, vectors, k)
+
+    def stored_vectors(self, results: dict[str, list[Document]]) -> dict[str, list[float]]:
+        """The vectors stored at ingestion for retrieved documents, keyed by id."""
+        snapshot = self.snapshot
+        vectors = {}
+        for collection, documents in results.items():
+            ids = [document.id for document in documents if getattr(document, "id", None)]
+            if ids:
+                found = snapshot.collection(collection).get(ids=ids, include=["embeddings"])
+                vectors.update(zip(found["ids"], found["embeddings"]))
+        return vectors
+
+    def get_unique_union(self, documents: list[Document]) -> list[Document]:
+        return unique_documents(documents)
 
     def remove_irrelevant_content(self, queries: list[str], retrieved_documents: list[Document]) -> str:
+        """LLM-based filter, one multi-second call per request. RagService uses tools.relevance_filter instead."""
         keep_only_relevant_content_chain = PromptTemplate(
             template=remove_irrelevant_content_prompt,
             input_variables=["queries", "retrieved_documents"],
@@ -0,0 +1,94 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("ApplicationService")
+
+
+@dataclass
+class EmbeddingBatch:
+    ids: list[str]
+    texts: list[str]
+    metadatas: list[dict]
+
+
+class BatchingEmbedder:
+    """Embeds ingestion chunks in fixed-size batches with a bounded number of requests in flight.
+
+    Failed batches are retried with exponential backoff and jitter. Every batch is handed to
+    the write callback as soon as its vectors arrive, so a later failure keeps the finished work.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 32,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        initial_backoff: float = 0.5
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedder")
+
+    def embed_and_write(
+        self,
+        ids: list[str],
+        texts: list[str],
+        metadatas: list[dict],
+        write: Callable[[EmbeddingBatch, list[list[float]]], None]
+    ) -> int:
+        """Embed the texts batch by batch and write each batch when it is done. Returns the number written."""
+        batches = [
+            EmbeddingBatch(
+                ids=ids[start:start + self.batch_size],
+                texts=texts[start:start + self.batch_size],
+                metadatas=metadatas[start:start + self.batch_size]
+            )
+            for start in range(0, len(ids), self.batch_size)
+        ]
+        futures = {self._pool.submit(self._embed_with_retry, batch.texts): batch for batch in batches}
+
+        written = 0
+        first_error = None
+        # Writes stay on the calling thread, only the embedding requests run in parallel
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                vectors = future.result()
+            except Exception as e:
+                first_error = first_error or e
+                continue
+
+            write(batch, vectors)
+            written += len(batch.ids)
+
+        if first_error is not None:
+            raise first_error
+
+        return written
+
+    def _embed_with_retry(self, texts: list[str]) -> list[list[float]]:
+        delay = self.initial_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except (ValueError, TypeError):
+                # Malformed input will fail the same way again
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning("Embedding batch of %s failed (%s), retrying in %.1fs", len(texts), e, delay)
+                time.sleep(delay + random.uniform(0, delay / 2))
+                delay *= 2
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("ApplicationService")
+
+DEFAULT_CACHE_PATH = "./chroma/embedding_cache.sqlite"
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and unicode variants so trivially different inputs share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with a bounded in-memory LRU in front of a persistent SQLite store.
+
+    Entries are keyed by the model name and a hash of the normalized text, so the
+    cache can be shared between models without collisions. Query and document
+    embeddings share entries, which holds for the Ollama models we use.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_path: str | None = DEFAULT_CACHE_PATH, max_memory_entries: int = 10000):
+        self.embeddings = embeddings
+        self.model_name = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_memory_entries = max_memory_entries
+        # float32 arrays, a quarter of the size of a list of Python floats
+        self._memory: OrderedDict[str, array] = OrderedDict()
+        # Guards the LRU and the counters, held only for dict operations so event-loop lookups never wait on disk
+        self._memory_lock = threading.Lock()
+        # Serializes use of the SQLite connection, which is only touched from threads in the async paths
+        self._connection_lock = threading.Lock()
+        self._connection = self._open_store(cache_path) if cache_path else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _open_store(self, cache_path: str) -> sqlite3.Connection:
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(cache_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        connection.commit()
+        return connection
+
+    def cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache_key(text) for text in texts]
+        found = self._lookup_memory(keys)
+        found.update(self._lookup_disk([key for key in dict.fromkeys(keys) if key not in found]))
+
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            found.update(self._remember_all(list(missing.keys()), vectors))
+            self._persist(list(missing.keys()), vectors)
+
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache_key(text) for text in texts]
+        found = self._lookup_memory(keys)
+        remaining = [key for key in dict.fromkeys(keys) if key not in found]
+        if remaining and self._connection is not None:
+            # SQLite reads and writes block, keep them off the event loop
+            found.update(await asyncio.to_thread(self._lookup_disk, remaining))
+
+        missing = self._missing(keys, texts, found)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            found.update(self._remember_all(list(missing.keys()), vectors))
+            if self._connection is not None:
+                await asyncio.to_thread(self._persist, list(missing.keys()), vectors)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_memory_entries": self.max_memory_entries
+        }
+
+    def _missing(self, keys: list[str], texts: list[str], found: dict) -> dict[str, str]:
+        """The unique texts that still need embedding, by key."""
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        with self._memory_lock:
+            self.misses += len(missing)
+
+        return missing
+
+    def _lookup_memory(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._memory_lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector.tolist()
+            self.memory_hits += len(found)
+
+        return found
+
+    def _lookup_disk(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        if not keys or self._connection is None:
+            return found
+
+        vectors = {}
+        with self._connection_lock:
+            try:
+                for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                    batch = keys[start:start + SQLITE_BATCH_SIZE]
+                    rows = self._connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        vectors[key] = vector
+            except sqlite3.Error as e:
+                # Treat an unreadable cache as a miss instead of failing the embedding call
+                logger.error("Error reading embeddings from cache: %s", e)
+
+        with self._memory_lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+                found[key] = vector.tolist()
+            self.disk_hits += len(found)
+
+        return found
+
+    def _remember_all(self, keys: list[str], vectors: list[list[float]]) -> dict[str, list[float]]:
+        stored = dict(zip(keys, vectors))
+        with self._memory_lock:
+            for key, vector in stored.items():
+                self._remember(key, array("f", vector))
+
+        return stored
+
+    def _persist(self, keys: list[str], vectors: list[list[float]]):
+        if self._connection is None:
+            return
+
+        with self._connection_lock:
+            try:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in zip(keys, vectors)]
+                )
+                self._connection.commit()
+            except sqlite3.Error as e:
+                logger.error("Error writing embeddings to cache: %s", e)
+
+    def _remember(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -1,89 +1,250 @@
 import re
+import time
+from collections import deque
+from typing import Iterable, Iterator
 from langchain.docstore.document import Document
 import spacy
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from fastapi import UploadFile
 import pdfplumber
+from config.metrics import record_span, span
+
+SPACY_MODEL = "nb_core_news_sm"
+# Components of nb_core_news_sm that sentence segmentation never reads
+UNUSED_COMPONENTS = ["morphologizer", "lemmatizer", "attribute_ruler", "ner"]
+SEGMENTATION_MODES = ("full", "parser", "senter", "rule")
+
+# Compiled once per process instead of on every call
+PRE_CLEAN_PATTERNS = [(re.compile(pattern), replacement) for pattern, replacement in [
+    # Replace tabs with spaces
+    (r'\t', ' '),
+    # Replace multiple newlines with single newline
+    (r'\n\s*\n', '\n'),
+    # Join words split by newlines
+    (r'(\w)\n(\w)', r'\1\2'),
+    # Replace newlines with spaces
+    (r'\n', ' '),
+    # Remove spaces before periods
+    (r'\s+\.', '.'),
+    # Remove spaced dashes
+    (r'\s-\s', ''),
+    # Number followed by capital letter (like "2020Venstres" -> "2020 Venstres")
+    (r'(\d)([A-ZÆØÅ][a-zæøå])', r'\1 \2'),
+    # Lowercase letter followed by capital (but not common abbreviations)
+    (r'([a-zæøå])([A-ZÆØÅ][a-zæøå]{2,})', r'\1 \2'),
+    # Colon followed immediately by capital letter
+    (r':([A-ZÆØÅ])', r': \1'),
+    # Period followed by number and capital (like ".2AnsvarAlle")
+    (r'\.(\d+)([A-ZÆØÅ][a-zæøå])', r'. \1. \2'),
+    # Clean up multiple spaces
+    (r' +', ' '),
+]]
+MULTIPLE_SPACES = re.compile(r' +')
+
 
 class EmbeddingTool():
-    def __init__(self):
-        self.nlp = spacy.load("nb_core_news_sm")
+    """Extracts, cleans and chunks PDF text for embedding.
+
+    segmentation selects the spaCy pipeline used to find sentence boundaries:
+    - "full": the complete nb_core_news_sm pipeline
+    - "parser": only tok2vec and the dependency parser, same sentences as "full"
+    - "senter": the statistical sentence recognizer, faster but slightly different boundaries
+    - "rule": punctuation-based sentencizer, fastest, cannot add missing periods
+    """
+
+    def __init__(self, window_chars: int = 50000, segmentation: str = "parser", n_process: int = 1, batch_size: int = 4):
+        self.segmentation = segmentation
+        self.nlp = self._load_pipeline(segmentation)
+        # Upper bound for the text handed to spaCy at once, far below nlp.max_length
+        self.window_chars = window_chars
+        # Windows are segmented through nlp.pipe, n_process > 1 fans them out to worker processes
+        self.n_process = n_process
+        self.batch_size = batch_size
+
+    def _load_pipeline(self, segmentation: str):
+        if segmentation == "full":
+            return spacy.load(SPACY_MODEL)
+
+        if segmentation == "parser":
+            return spacy.load(SPACY_MODEL, exclude=UNUSED_COMPONENTS)
+
+        if segmentation == "senter":
+            nlp = spacy.load(SPACY_MODEL, exclude=UNUSED_COMPONENTS + ["parser"])
+            nlp.enable_pipe("senter")
+            return nlp
+
+        if segmentation == "rule":
+            nlp = spacy.blank("nb")
+            nlp.add_pipe("sentencizer")
+            return nlp
+
+        raise ValueError(f"Unknown segmentation mode: {segmentation}, expected one of {SEGMENTATION_MODES}")
 
     def create_chunks_from_document(self, file: UploadFile, chunk_size: int = 1000) -> list[Document]:
-        cleaned_text = self.clean_text(self.get_document_as_text(file))
+        return self.split_text_into_chunks(self.get_cleaned_text(file), chunk_size=chunk_size)
+
+    def create_chunks_from_pattern(self, file: UploadFile, pattern: str) -> list[Document]:
+        return self.find_pattern_in_text(self.get_cleaned_text(file), pattern=pattern)
+
+    def create_chunks_and_pattern_matches(self, file: UploadFile, pattern: str, chunk_size: int = 1000) -> tuple[list[Document], list[Document]]:
+        """Parse and clean the document once and derive both the chunks and the pattern matches from it."""
+        chunks, matches = [], []
+        for kind, document in self.iter_chunks_and_pattern_matches(file, pattern=pattern, chunk_size=chunk_size):
+            (chunks if kind == "chunk" else matches).append(document)
+
+        return chunks, matches
+
+    def iter_chunks_and_pattern_matches(self, file: UploadFile, pattern: str, chunk_size: int = 1000, pages: Iterable[str] | None = None) -> Iterator[tuple[str, Document]]:
+        """Stream ("chunk", Document) and ("quote", Document) pairs from a single pass over the pages.
+
+        Pages are extracted, cleaned and split lazily, so only a window of the document
+        is in memory and consumers can embed the first chunks before the last page is read.
+        pages overrides the page text source, e.g. to count pages while they stream.
+        """
+        regex = re.compile(pattern)
+        matches = deque()
+        pages = self.iter_pages(file) if pages is None else pages
+
+        def segments_collecting_matches():
+            for segment in self.iter_cleaned_segments(pages):
+                matches.extend(regex.findall(segment))
+                yield segment
+
+        for chunk in self.iter_chunks(segments_collecting_matches(), chunk_size=chunk_size):
+            while matches:
+                yield "quote", Document(page_content=matches.popleft())
+            yield "chunk", chunk
+
+        while matches:
+            yield "quote", Document(page_content=matches.popleft())
+
+    def get_cleaned_text(self, file: UploadFile) -> str:
+        return " ".join(self.iter_cleaned_segments(self.iter_pages(file)))
+
+    def split_text_into_chunks(self, cleaned_text: str, chunk_size: int = 1000) -> list[Document]:
         text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=200
             )
         chunks = text_splitter.split_text(text=cleaned_text)
         document_chunks = [Document(page_content=chunk) for chunk in chunks]
-        
+
         return document_chunks
-    
-    def create_chunks_from_pattern(self, file: UploadFile, pattern: str) -> list[Document]:
-        cleaned_text = self.clean_text(self.get_document_as_text(file))
+
+    def find_pattern_in_text(self, cleaned_text: str, pattern: str) -> list[Document]:
         regex = re.compile(pattern)
         chunks = regex.findall(cleaned_text)
         document_chunks = [Document(page_content=chunk) for chunk in chunks]
 
         return document_chunks
 
-    
+    def iter_chunks(self, segments: Iterable[str], chunk_size: int = 1000) -> Iterator[Document]:
+        """Split a stream of cleaned segments into the same chunks split_text_into_chunks gives for the joined text."""
+        text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=200,
+                add_start_index=True
+            )
+        pending = ""
+        for segment in segments:
+            pending = f"{pending} {segment}" if pending else segment
+            if len(pending) < 4 * chunk_size:
+                continue
+
+            documents = text_splitter.create_documents([pending])
+            for document in documents[:-1]:
+                yield Document(page_content=document.page_content)
+            # The last chunk may still grow, restart the splitter where it begins. The splitter
+            # counts the separator in front of a piece, so keep the whitespace that start_index skips.
+            start = documents[-1].metadata["start_index"]
+            while start > 0 and pending[start - 1].isspace():
+                start -= 1
+            pending = pending[start:]
+
+        for chunk in text_splitter.split_text(pending):
+            yield Document(page_content=chunk)
+
+    def iter_cleaned_segments(self, raw_pieces: Iterable[str]) -> Iterator[str]:
+        """Clean raw text in bounded windows cut at sentence ends, so spaCy never sees the whole document."""
+        # Seconds spent pulling raw pieces, i.e. extracting pages, which is pdf_extract and not cleaning
+        pulling = [0.0]
+
+        def cleaned_windows():
+            windows = self._iter_windows(raw_pieces)
+            while True:
+                start = time.perf_counter()
+                window = next(windows, None)
+                pulling[0] += time.perf_counter() - start
+                if window is None:
+                    return
+                yield self.pre_clean_for_spacy(window)
+
+        docs = self.nlp.pipe(cleaned_windows(), batch_size=self.batch_size, n_process=self.n_process)
+        while True:
+            # Timed per segment, outside the yield, so the consumer's work is not counted
+            start, pulled = time.perf_counter(), pulling[0]
+            doc = next(docs, None)
+            segment = MULTIPLE_SPACES.sub(' ', self._join_sentences(doc)).strip() if doc is not None else ""
+            record_span("clean_text", time.perf_counter() - start - (pulling[0] - pulled))
+            if doc is None:
+                return
+            if segment:
+                yield segment
+
+    def _iter_windows(self, raw_pieces: Iterable[str]) -> Iterator[str]:
+        pending = ""
+        for piece in raw_pieces:
+            pending += piece
+            while len(pending) >= self.window_chars:
+                cut = self._find_window_cut(pending)
+                yield pending[:cut]
+                pending = pending[cut:]
+
+        if pending.strip():
+            yield pending
+
+    def _find_window_cut(self, text: str) -> int:
+        # Prefer the end of the last full sentence inside the window, then the last space
+        sentence_end = max(text.rfind(". ", 0, self.window_chars), text.rfind(".\n", 0, self.window_chars))
+        if sentence_end > 0:
+            return sentence_end + 1
+
+        space = text.rfind(" ", 0, self.window_chars)
+        return space if space > 0 else self.window_chars
+
+
     def pre_clean_for_spacy(self, text: str) -> str:
-        patterns = [
-            # Replace tabs with spaces
-            (r'\t', ' '),
-            # Replace multiple newlines with single newline
-            (r'\n\s*\n', '\n'),
-            # Join words split by newlines
-            (r'(\w)\n(\w)', r'\1\2'),
-            # Replace newlines with spaces
-            (r'\n', ' '),
-            # Remove spaces before periods
-            (r'\s+\.', '.'),
-            # Remove spaced dashes
-            (r'\s-\s', ''),
-            # Number followed by capital letter (like "2020Venstres" -> "2020 Venstres")
-            (r'(\d)([A-ZÆØÅ][a-zæøå])', r'\1 \2'),
-            # Lowercase letter followed by capital (but not common abbreviations)
-            (r'([a-zæøå])([A-ZÆØÅ][a-zæøå]{2,})', r'\1 \2'),
-            # Colon followed immediately by capital letter
-            (r':([A-ZÆØÅ])', r': \1'),
-            # Period followed by number and capital (like ".2AnsvarAlle")  
-            (r'\.(\d+)([A-ZÆØÅ][a-zæøå])', r'. \1. \2'),
-            # Clean up multiple spaces
-            (r' +', ' '),
-        ]
-        
-        for pattern, replacement in patterns:
-            text = re.sub(pattern, replacement, text)
-        
+        for pattern, replacement in PRE_CLEAN_PATTERNS:
+            text = pattern.sub(replacement, text)
+
         return text
-    
+
     def add_periods_with_spacy(self, text) -> str:
         """Use spaCy to add periods at sentence boundaries."""
-        doc = self.nlp(text)
-        result = ""
-        
+        return self._join_sentences(self.nlp(text))
+
+    def _join_sentences(self, doc) -> str:
+        sentences = []
+
         for sent in doc.sents:
             sentence = sent.text.strip()
             if sentence and not sentence.endswith(('.', '!', '?', ':')):
                 sentence += '.'
-            result += sentence + ' '
-        
-        return result.strip()
+            sentences.append(sentence)
+
+        return ' '.join(sentences).strip()
 
     def clean_text(self, text: str) -> str:
-        text = self.pre_clean_for_spacy(text)
-        text = self.add_periods_with_spacy(text)
-        text = re.sub(r' +', ' ', text)  # Remove any remaining multiple spaces
-        
-        return text
-    
-    def get_document_as_text(self, file: UploadFile) -> str:
-        text = ""
+        return " ".join(self.iter_cleaned_segments([text]))
+
+    def iter_pages(self, file: UploadFile) -> Iterator[str]:
         with pdfplumber.open(file.file) as pdf:
             for page in pdf.pages:
-                text += page.extract_text()
+                with span("pdf_extract"):
+                    text = page.extract_text() or ""
+                yield text
+                # Drop the parsed layout objects, they are not needed once the text is out
+                page.close()
 
-        return text
\ No newline at end of file
+    def get_document_as_text(self, file: UploadFile) -> str:
+        return "".join(self.iter_pages(file))
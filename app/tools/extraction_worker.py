@@ -0,0 +1,96 @@
+import os
+from dataclasses import dataclass, field
+from io import BytesIO
+from config.metrics import collect_spans
+from tools.embedding_tool import EmbeddingTool
+
+# One EmbeddingTool (and spaCy pipeline) per worker process, loaded by the pool initializer
+_embedding_tool: EmbeddingTool | None = None
+
+
+# Documents per batch a worker puts on the queue, a quarter of an ingestion commit
+EXTRACTION_BATCH_SIZE = 64
+
+
+class ExtractionFailed(Exception):
+    """Put on the batch queue instead of the end marker when a worker could not finish a document."""
+
+
+@dataclass
+class ExtractedDocument:
+    """Counts for one extracted file, the chunk and quote texts themselves go through the batch queue.
+
+    timings holds the (stage, seconds) spans measured in the worker, whose metrics registry is
+    never served, so the parent process records them.
+    """
+    filename: str
+    pages: int = 0
+    chunks: int = 0
+    quotes: int = 0
+    timings: list[tuple[str, float]] = field(default_factory=list)
+
+
+class BytesUploadFile:
+    """The part of fastapi.UploadFile that EmbeddingTool reads, backed by in-memory bytes."""
+
+    def __init__(self, filename: str, content: bytes):
+        self.filename = filename
+        self.file = BytesIO(content)
+
+    @classmethod
+    def from_path(cls, path: str) -> "BytesUploadFile":
+        with open(path, "rb") as f:
+            return cls(os.path.basename(path), f.read())
+
+
+def initialize_worker(segmentation: str):
+    global _embedding_tool
+    _embedding_tool = EmbeddingTool(segmentation=segmentation)
+
+
+def extract_document(filename: str, content: bytes, pattern: str, batches, chunk_size: int = 1000, batch_size: int = EXTRACTION_BATCH_SIZE) -> ExtractedDocument:
+    """Parse, clean and chunk one PDF inside a pool worker, streaming it to the parent as it goes.
+
+    batches is a manager queue that receives lists of (collection, text) pairs as soon as they
+    are chunked, so the parent embeds the first chunks while later pages are still parsed.
+    None follows the last batch, or an ExtractionFailed if the document could not be read.
+    """
+    if _embedding_tool is None:
+        initialize_worker(segmentation="parser")
+
+    extracted = ExtractedDocument(filename=filename)
+    upload = BytesUploadFile(filename, content)
+
+    def counted_pages():
+        for page in _embedding_tool.iter_pages(upload):
+            extracted.pages += 1
+            yield page
+
+    try:
+        with collect_spans() as spans:
+            batch = []
+            for kind, document in _embedding_tool.iter_chunks_and_pattern_matches(
+                file=upload,
+                pattern=pattern,
+                chunk_size=chunk_size,
+                pages=counted_pages()
+            ):
+                if kind == "chunk":
+                    extracted.chunks += 1
+                else:
+                    extracted.quotes += 1
+                batch.append((kind, document.page_content))
+                if len(batch) >= batch_size:
+                    batches.put(batch)
+                    batch = []
+
+            if batch:
+                batches.put(batch)
+    except Exception as e:
+        batches.put(ExtractionFailed(f"Could not extract {filename}: {e}"))
+        raise
+
+    batches.put(None)
+    extracted.timings = spans
+
+    return extracted
@@ -1,3 +1,5 @@
+import asyncio
+import logging
 from model.anonymize_model import AnonymizedQuestion, DeanonymizedPlan
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
@@ -5,43 +7,136 @@ from langchain_openai import ChatOpenAI
 from model.plan_model import Plan
 from langchain.schema.runnable import RunnableSequence
 from model.queries_from_plan import QueriesFromPlan
-from prompts.prompt_manager import anonymizer_prompt, planner_prompt, deanonymize_prompt, queries_from_plan_prompt
+from model.fast_plan_model import FastPlan
+from prompts.prompt_manager import anonymizer_prompt, planner_prompt, deanonymize_prompt, queries_from_plan_prompt, fast_planner_prompt
+from services.planning_cache import PlanningCache, planning_cache_key
+from config.metrics import span
+
+logger = logging.getLogger("ApplicationService")
 
 class PlanningTool:
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(self, llm: ChatOpenAI, cache: PlanningCache | None = None):
         self.llm = llm
+        # Stage outputs are deterministic at temperature 0, repeated questions are served from the cache
+        self.cache = cache
 
 
     def anonymize_question(self, question: str) -> AnonymizedQuestion:
-        return self \
-            .build_chain(["question"], anonymizer_prompt, AnonymizedQuestion) \
-            .invoke(input=question)
+        return self.cached_invoke("anonymize", ["question"], anonymizer_prompt, AnonymizedQuestion, {
+            "question": question
+        })
     
 
     def create_initial_plan(self, question: str) -> Plan:
-        return self \
-            .build_chain(["question"], planner_prompt, Plan) \
-            .invoke(input=question)
+        return self.cached_invoke("plan", ["question"], planner_prompt, Plan, {
+            "question": question
+        })
 
 
     def deanonymize_plan(self, plan: str, mapping:str) -> Plan:
-        return self \
-            .build_chain(["plan", "mapping"], deanonymize_prompt, Plan) \
-            .invoke({
-                "plan": plan,
-                "mapping": mapping
-            })
+        return self.cached_invoke("deanonymize", ["plan", "mapping"], deanonymize_prompt, Plan, {
+            "plan": plan,
+            "mapping": mapping
+        })
     
 
     def create_queries_from_plan(self, question: str, plan: Plan) -> QueriesFromPlan:
-        return self \
-            .build_chain(["question", "plan"], queries_from_plan_prompt, QueriesFromPlan) \
-            .invoke({
-                "question": question,
-                "plan": plan.steps
-            })
+        return self.cached_invoke("queries", ["question", "plan"], queries_from_plan_prompt, QueriesFromPlan, {
+            "question": question,
+            "plan": plan.steps
+        })
+
+
+    def create_fast_plan(self, question: str) -> FastPlan:
+        """Plan steps and retrieval queries in one call, instead of the four-stage chain."""
+        return self.cached_invoke("fast_plan", ["question"], fast_planner_prompt, FastPlan, {
+            "question": question
+        })
+
+
+    async def aanonymize_question(self, question: str) -> AnonymizedQuestion:
+        return await self.acached_invoke("anonymize", ["question"], anonymizer_prompt, AnonymizedQuestion, {
+            "question": question
+        })
+
+
+    async def acreate_initial_plan(self, question: str) -> Plan:
+        return await self.acached_invoke("plan", ["question"], planner_prompt, Plan, {
+            "question": question
+        })
+
+
+    async def adeanonymize_plan(self, plan: str, mapping: str) -> Plan:
+        return await self.acached_invoke("deanonymize", ["plan", "mapping"], deanonymize_prompt, Plan, {
+            "plan": plan,
+            "mapping": mapping
+        })
+
+
+    async def acreate_queries_from_plan(self, question: str, plan: Plan) -> QueriesFromPlan:
+        return await self.acached_invoke("queries", ["question", "plan"], queries_from_plan_prompt, QueriesFromPlan, {
+            "question": question,
+            "plan": plan.steps
+        })
+
+
+    async def acreate_fast_plan(self, question: str) -> FastPlan:
+        return await self.acached_invoke("fast_plan", ["question"], fast_planner_prompt, FastPlan, {
+            "question": question
+        })
+
+
+    def cached_invoke(self, stage: str, input_variables: list[str], prompt: str, format_object, inputs: dict):
+        key = self._cache_key(stage, prompt, inputs)
+        cached = self._lookup(stage, key, format_object)
+        if cached is not None:
+            return cached
+
+        with span(stage):
+            result = self.build_chain(input_variables, prompt, format_object).invoke(inputs)
+        self._store(stage, key, result)
+        return result
+
+
+    async def acached_invoke(self, stage: str, input_variables: list[str], prompt: str, format_object, inputs: dict):
+        key = self._cache_key(stage, prompt, inputs)
+        if key is not None:
+            # The cache may read and write SQLite, keep it off the event loop
+            cached = await asyncio.to_thread(self._lookup, stage, key, format_object)
+            if cached is not None:
+                return cached
+
+        with span(stage):
+            result = await self.build_chain(input_variables, prompt, format_object).ainvoke(inputs)
+        if key is not None:
+            await asyncio.to_thread(self._store, stage, key, result)
+        return result
+
+
+    def _cache_key(self, stage: str, prompt: str, inputs: dict) -> str | None:
+        if self.cache is None:
+            return None
+        model_name = getattr(self.llm, "model_name", None) or type(self.llm).__name__
+        return planning_cache_key(stage, prompt, model_name, inputs)
+
+
+    def _lookup(self, stage: str, key: str | None, format_object):
+        if key is None:
+            return None
+
+        value = self.cache.get(key)
+        if value is None:
+            return None
+
+        logger.info("[dim]Planning cache hit for stage[/dim] [bold]%s[/bold]", stage)
+        return format_object.model_validate_json(value)
+
+
+    def _store(self, stage: str, key: str | None, result):
+        if key is not None and result is not None:
+            self.cache.set(key, stage, result.model_dump_json())
+
 
-    
     def build_chain(self, input_variables: list[str], prompt: str, format_object) -> RunnableSequence:
         chain = (
             PromptTemplate(
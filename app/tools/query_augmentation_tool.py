@@ -15,11 +15,11 @@ class QueryAugmentationTool():
             perspectives = perspective_chain.invoke({"question": question})
             
             queries = [q.strip() for q in perspectives.split("\n") if q.strip()]
-            logger.info(f"Generated queries: {queries}")
+            logger.info("Generated queries: %s", queries)
             
             return queries
         except Exception as e:
-            logger.error(f"Error generating queries: {e}")
+            logger.error("Error generating queries: %s", e)
             raise
 
 
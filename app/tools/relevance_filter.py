@@ -0,0 +1,145 @@
+import logging
+import re
+import time
+from dataclasses import replace
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from services.context_builder import Passage
+
+logger = logging.getLogger("ApplicationService")
+
+# The cleaned text ends every sentence with punctuation, see EmbeddingTool._join_sentences
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?:])\s+(?=[A-ZÆØÅ0-9«"(])')
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class RelevanceFilter:
+    """Drops stitched passages whose chunks are far from every query, then prunes the sentences of the rest.
+
+    Passages are scored with the chunk vectors stored at ingestion, so the passage cut is one matrix
+    product and never calls the embedding model. A passage scores by its closest chunk to its
+    closest query. The sentences of the kept passages are then embedded in one batch and scored
+    the same way. Both cut-offs adapt to the score distribution of the request, mean plus
+    threshold_std standard deviations, but never drop below min_similarity. The min_passages
+    best passages, and the min_sentences best sentences of each kept passage, are always kept
+    so the answer never loses all of its context.
+    """
+
+    def __init__(self, min_similarity: float = 0.35, threshold_std: float = 0.5, min_passages: int = 3, min_sentences: int = 1):
+        self.min_similarity = min_similarity
+        self.threshold_std = threshold_std
+        self.min_passages = min_passages
+        self.min_sentences = min_sentences
+
+    def filter(self, query_vectors: list[list[float]], passages: list[Passage], vectors_by_id: dict[str, list[float]]) -> list[Passage]:
+        """Passages close enough to the queries, in their original order with relevance set.
+
+        Passages without any stored vector cannot be scored and are kept.
+        """
+        start = time.perf_counter()
+        scored = [(position, [vectors_by_id[chunk_id] for chunk_id in passage.ids if chunk_id in vectors_by_id]) for position, passage in enumerate(passages)]
+        scored = [(position, vectors) for position, vectors in scored if vectors]
+        if not scored or not query_vectors:
+            return passages
+
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+        chunks = normalize_rows(np.asarray([vector for _, vectors in scored for vector in vectors], dtype=np.float32))
+        # (chunks x queries) cosine matrix in one product, each chunk scores by its closest query
+        chunk_scores = (chunks @ queries.T).max(axis=1)
+
+        scores = np.empty(len(scored), dtype=np.float32)
+        offset = 0
+        for row, (_, vectors) in enumerate(scored):
+            scores[row] = chunk_scores[offset:offset + len(vectors)].max()
+            offset += len(vectors)
+
+        threshold = self.threshold(scores)
+        keep = scores >= threshold
+        if self.min_passages > 0:
+            # A slice from -0 would keep every passage
+            keep[np.argsort(scores)[-self.min_passages:]] = True
+
+        dropped = set()
+        for (position, _), score, kept in zip(scored, scores, keep):
+            passages[position].relevance = float(score)
+            if not kept:
+                dropped.add(position)
+
+        filtered = [passage for position, passage in enumerate(passages) if position not in dropped]
+        logger.info(
+            "[dim]Relevance filter kept %s of %s passages (threshold %.2f) in %.1fms[/dim]",
+            len(filtered), len(passages), threshold, (time.perf_counter() - start) * 1000
+        )
+        return filtered
+
+    def prune_sentences(self, query_vectors: list[list[float]], passages: list[Passage], embeddings: Embeddings) -> list[Passage]:
+        """Passages cut down to their sentences close to the queries, in their original order.
+
+        Only passages with more than one sentence are embedded, through embeddings in one batch.
+        """
+        split = [split_sentences(passage.text) for passage in passages]
+        sentences = self._unique_sentences(split)
+        if not sentences or not query_vectors:
+            return passages
+
+        start = time.perf_counter()
+        vectors = embeddings.embed_documents(sentences)
+        return self._prune(query_vectors, passages, split, sentences, vectors, start)
+
+    async def aprune_sentences(self, query_vectors: list[list[float]], passages: list[Passage], embeddings: Embeddings) -> list[Passage]:
+        split = [split_sentences(passage.text) for passage in passages]
+        sentences = self._unique_sentences(split)
+        if not sentences or not query_vectors:
+            return passages
+
+        start = time.perf_counter()
+        vectors = await embeddings.aembed_documents(sentences)
+        return self._prune(query_vectors, passages, split, sentences, vectors, start)
+
+    def _unique_sentences(self, split: list[list[str]]) -> list[str]:
+        # A single sentence has nothing to prune, and repeated sentences are embedded once
+        return list(dict.fromkeys(sentence for sentences in split if len(sentences) > 1 for sentence in sentences))
+
+    def _prune(self, query_vectors, passages: list[Passage], split: list[list[str]], sentences: list[str], sentence_vectors, start: float) -> list[Passage]:
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32))
+        candidates = normalize_rows(np.asarray(sentence_vectors, dtype=np.float32))
+        # (sentences x queries) cosine matrix in one product, each sentence scores by its closest query
+        scores = (candidates @ queries.T).max(axis=1)
+        score_by_sentence = dict(zip(sentences, scores.tolist()))
+        threshold = self.threshold(scores)
+
+        pruned, kept_sentences = [], 0
+        for passage, passage_sentences in zip(passages, split):
+            if len(passage_sentences) <= 1:
+                pruned.append(passage)
+                kept_sentences += len(passage_sentences)
+                continue
+
+            passage_scores = np.asarray([score_by_sentence[sentence] for sentence in passage_sentences])
+            keep = passage_scores >= threshold
+            if self.min_sentences > 0:
+                keep[np.argsort(passage_scores)[-self.min_sentences:]] = True
+
+            kept_sentences += int(keep.sum())
+            if keep.all():
+                pruned.append(passage)
+            else:
+                text = " ".join(sentence for sentence, kept in zip(passage_sentences, keep) if kept)
+                pruned.append(replace(passage, text=text))
+
+        logger.info(
+            "[dim]Relevance filter kept %s of %s sentences (threshold %.2f) in %.1fms[/dim]",
+            kept_sentences, sum(len(sentences) for sentences in split), threshold, (time.perf_counter() - start) * 1000
+        )
+        return pruned
+
+    def threshold(self, scores: np.ndarray) -> float:
+        return max(self.min_similarity, float(scores.mean() + self.threshold_std * scores.std()))
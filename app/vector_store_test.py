@@ -0,0 +1,65 @@
+from langchain.docstore.document import Document
+from benchmarks.stand_ins import StandInEmbeddings
+from services.vector_store import VectorStore, document_id
+
+
+class CountingEmbeddings(StandInEmbeddings):
+    def __init__(self):
+        super().__init__(dimensions=16)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def open_store() -> tuple[VectorStore, CountingEmbeddings]:
+    embeddings = CountingEmbeddings()
+    store = VectorStore.in_memory()
+    store.initialize(llm=None, embeddings=embeddings)
+    return store, embeddings
+
+
+def ingest(store: VectorStore, texts: list[str], source: str = "program.pdf"):
+    [report] = store.ingest_documents(source, "chunk", [("chunk", Document(page_content=text)) for text in texts])
+    return report.new, report.skipped, report.replaced
+
+
+def test_reingesting_an_unchanged_document_embeds_nothing():
+    store, embeddings = open_store()
+
+    assert ingest(store, ["a", "b", "c"]) == (3, 0, 0)
+    embeddings.embedded.clear()
+    assert ingest(store, ["a", "b", "c"]) == (0, 3, 0)
+
+    assert embeddings.embedded == []
+    assert store.chunk_vectorstore.count() == 3
+
+
+def test_a_new_version_adds_changed_chunks_and_removes_stale_ones():
+    store, embeddings = open_store()
+    ingest(store, ["a", "b", "c"])
+    embeddings.embedded.clear()
+
+    assert ingest(store, ["a", "c", "d"]) == (1, 2, 1)
+
+    assert embeddings.embedded == ["d"]
+    stored = store.chunk_vectorstore.get()
+    assert sorted(stored["documents"]) == ["a", "c", "d"]
+    assert set(stored["ids"]) == {document_id("program.pdf", text) for text in ["a", "c", "d"]}
+
+
+def test_identical_chunks_within_a_file_are_stored_once():
+    store, embeddings = open_store()
+
+    assert ingest(store, ["a", "a", "b"]) == (2, 1, 0)
+    assert embeddings.embedded == ["a", "b"]
+
+
+def test_ids_and_stale_removal_are_per_source():
+    store, _ = open_store()
+    ingest(store, ["a", "b"], source="program.pdf")
+
+    assert ingest(store, ["a"], source="prinsipper.pdf") == (1, 0, 0)
+    assert ingest(store, ["b"], source="program.pdf") == (0, 1, 1)
+    assert store.chunk_vectorstore.count() == 2